@@ -1,96 +1,88 @@
+import os
+import sys
 import pandas as pd
 from itertools import chain
-import ast
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from vocab import UNK, VOCAB_FN, load_or_build_vocab
+from tag_codebook import codebook
+from mention_index import get_mention_index
 
+# annotated_corpus.py is shared with the annotation scripts in the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from annotated_corpus import read_token_table
 
-def get_tok2idx(Words):
-    vocab = list(set(Words))
+# Token corpus written by tag_merge.merge_folder
+DATA_FN = r"C:\Users\JJ199\Downloads\all_annotated_regex.arrow"
+
+
+def get_tok2idx(sentences, fn=VOCAB_FN, min_count=1):
+    # Built once from the sentences and saved to fn, later runs load the same ids
+    vocab = load_or_build_vocab(sentences, fn, min_count=min_count)
 
     tok2idx = {tok: idx for idx, tok in enumerate(vocab)}
 
     return tok2idx
 
 def create_token_list(words, token2idx):
-    return [token2idx[word] for word in words]
+    unk = token2idx.get(UNK)
+    return [token2idx.get(word, unk) for word in words]
+
+
+def tag_codes(tags):
+    """
+    Codebook codes of every row of the tags column of the token corpus. The column stores dictionary indices,
+    only its dictionary of tag names is looked up in the codebook
+    """
+    tags = tags.combine_chunks()
+    offsets = tags.offsets.to_numpy()
+    values = tags.flatten()
+    lookup = codebook.encode(values.dictionary.to_pylist())
+    codes = lookup[values.indices.to_numpy()]
+
+    return np.split(codes, offsets[1:-1] - offsets[0])
 
+def load_data(sections=None, fn=DATA_FN):
+    # Load data, the words and tags are read as lists without parsing any strings
+    table = read_token_table(fn, ['words', 'tags', 'section'])
 
-def load_data():
-    # Load data
-    df = pd.read_csv(r"C:\Users\JJ199\Downloads\all_annotated_regex.csv")
+    # Only keep sentences of the given sections of the judgments. Sentences without a section (not annotated
+    # by section, or their sections were not recognised) are kept
+    if sections is not None:
+        table = table.filter(pc.fill_null(pc.is_in(table['section'], value_set=pa.array(list(sections))), True))
 
-    # Set correct type for list
-    df['Word'] = df['Word'].apply(ast.literal_eval)
+    df = pd.DataFrame({'Word': table['words'].to_pylist(), 'Tag': table['tags'].to_pylist()})
+
+    # Tags as int8 codes, so the labeling functions can use NumPy masks
+    df['Tag_code'] = tag_codes(table['tags'])
 
     # Create index for all words (Bag of Words)
-    token2idx = get_tok2idx(df['Word'].apply(pd.Series).stack().reset_index(drop = True))
+    token2idx = get_tok2idx(df['Word'])
 
     # Add indices
     df['Word_idx'] = df['Word'].map(lambda x: create_token_list(x, token2idx))
 
     # Groupby and collect columns
-    df = df[['Word', 'Word_idx', 'Tag']]
+    df = df[['Word', 'Word_idx', 'Tag', 'Tag_code']]
 
     return df
 
 
-def create_tag_df(df, label1: str, label2: str):
-    # For every sentence
-    ids1 = []
-    ids2 = []
-    for i in range(df.shape[0]):
-        # Get PERSON_ID and tokens
-        id1 = -1
-        id2 = -1
-        tags = df.iloc[i]['Tag']
-        for j in range(len(tags)):
-            if 'B {}'.format(label1) in tags[j]:
-                if id1 == -1:
-                    id1 = j
-            elif 'B {}'.format(label2) in tags[j]:
-                if id2 == -1:
-                    id2 = j
-
-        # Add tokens and
-        ids1.append(id1 if id1 != -1 and id2 != -1 else -1)
-        ids2.append(id2 if id1 != -1 and id2 != -1 else -1)
-
+def candidate_df(df, ids1, ids2):
     # Create dataframe for snorkel
-    df_train = pd.DataFrame({'tokens': df.Word, 'id1': ids1, 'id2': ids2,
-                             'between_tokens': [[] for _ in range(df.shape[0])],
-                             'text_left_1': [[] for _ in range(df.shape[0])],
-                             'text_left_2': [[] for _ in range(df.shape[0])],
-                             'text_right_1': [[] for _ in range(df.shape[0])],
-                             'text_right_2': [[] for _ in range(df.shape[0])]})
-
-    return df_train
+    return pd.DataFrame({'tokens': df.Word, 'id1': ids1, 'id2': ids2,
+                         'between_tokens': [[] for _ in range(df.shape[0])],
+                         'text_left_1': [[] for _ in range(df.shape[0])],
+                         'text_left_2': [[] for _ in range(df.shape[0])],
+                         'text_right_1': [[] for _ in range(df.shape[0])],
+                         'text_right_2': [[] for _ in range(df.shape[0])]})
+
+def create_tag_df(df, label1, label2):
+    # label1 and label2 are an entity type or a list of them
+    ids1, ids2 = get_mention_index(df).candidates(label1, label2)
+    return candidate_df(df, ids1.tolist(), ids2.tolist())
 
 def create_tag_df_special(df, label1: list, label2: list):
-    # For every sentence
-    ids1 = []
-    ids2 = []
-    for i in range(df.shape[0]):
-        # Get PERSON_ID and tokens
-        id1 = -1
-        id2 = -1
-        tags = df.iloc[i]['Tag']
-        for j in range(len(tags)):
-            if any('B {}'.format(x) in tags[j] for x in label1):
-                if id1 == -1:
-                    id1 = j
-            elif any('B {}'.format(x) in tags[j] for x in label2):
-                if id2 == -1:
-                    id2 = j
-
-        # Add tokens and
-        ids1.append(id1 if id1 != -1 and id2 != -1 else -1)
-        ids2.append(id2 if id1 != -1 and id2 != -1 else -1)
-
-    # Create dataframe for snorkel
-    df_train = pd.DataFrame({'tokens': df.Word, 'id1': ids1, 'id2': ids2,
-                             'between_tokens': [[] for _ in range(df.shape[0])],
-                             'text_left_1': [[] for _ in range(df.shape[0])],
-                             'text_left_2': [[] for _ in range(df.shape[0])],
-                             'text_right_1': [[] for _ in range(df.shape[0])],
-                             'text_right_2': [[] for _ in range(df.shape[0])]})
-
-    return df_train
+    ids1, ids2 = get_mention_index(df).candidates(label1, label2)
+    return candidate_df(df, ids1.tolist(), ids2.tolist())
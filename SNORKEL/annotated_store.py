@@ -0,0 +1,134 @@
+import ast
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Labeled relation dataset written by label_relations.py
+ANNOTATED_FN = "annotated_all.parquet"
+ANNOTATED_CSV_FN = "annotated_all.csv"
+
+# Native list types of the list columns, all other columns are inferred
+LIST_COLUMNS = {
+    'Word': pa.list_(pa.string()),
+    'Word_idx': pa.list_(pa.int32()),
+    'Tag': pa.list_(pa.string()),
+    'Tag_code': pa.list_(pa.int8()),
+}
+
+def to_list(cell):
+    # List cells that were written to csv are their repr
+    if isinstance(cell, str):
+        return ast.literal_eval(cell)
+    return list(cell)
+
+def to_table(df):
+    columns = {}
+    for column in df.columns:
+        if column.startswith('Unnamed'):
+            continue
+        if column in LIST_COLUMNS:
+            columns[column] = pa.array([to_list(cell) for cell in df[column]], LIST_COLUMNS[column])
+        else:
+            columns[column] = pa.array(df[column])
+
+    return pa.table(columns)
+
+def write_annotated(df, fn=ANNOTATED_FN, row_group_size=16384):
+    """
+    Writes the labeled dataset with native list columns, through a temporary file
+    """
+    tmp_fn = fn + ".tmp"
+    pq.write_table(to_table(df), tmp_fn, row_group_size=row_group_size)
+    os.replace(tmp_fn, fn)
+
+def read_table(fn=ANNOTATED_FN, columns=None):
+    return pq.read_table(fn, columns=columns)
+
+def read_annotated(fn=ANNOTATED_FN, columns=None):
+    """
+    The labeled dataset as before, with Word, Word_idx and Tag as Python lists
+    """
+    table = read_table(fn, columns)
+    return pd.DataFrame({name: (table.column(name).to_pylist() if name in LIST_COLUMNS
+                                else table.column(name).to_pandas()) for name in table.column_names})
+
+def read_list_column(fn=ANNOTATED_FN, column='Word_idx'):
+    """
+    The values of all rows of a list column as one flat NumPy array and the offsets of the rows in it
+    """
+    array = read_table(fn, [column]).column(column).combine_chunks()
+    offsets = array.offsets.to_numpy()
+    values = array.values.to_numpy(zero_copy_only=False)
+
+    # Offsets are relative to the start of the values of a sliced array
+    return values[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+def padded(values, offsets, max_length=128, pad=0):
+    """
+    Pads or truncates every row to max_length, as pad_or_truncate of train_re_model.py, without a Python loop
+    """
+    lengths = np.minimum(np.diff(offsets), max_length)
+    out = np.full((len(lengths), max_length), pad, dtype=values.dtype)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    out[rows, cols] = values[np.repeat(offsets[:-1], lengths) + cols]
+
+    return out
+
+def convert_annotated_csv(csv_fn=ANNOTATED_CSV_FN, fn=ANNOTATED_FN, sep="|", chunksize=50000):
+    """
+    Converts an annotated_all.csv, the list reprs are parsed one last time. Returns the number of rows
+    """
+    n_rows = 0
+    tmp_fn = fn + ".tmp"
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_fn, sep=sep, chunksize=chunksize):
+            table = to_table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_fn, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_fn, fn)
+
+    return n_rows
+
+def benchmark_load(csv_fn=ANNOTATED_CSV_FN, fn=ANNOTATED_FN, sep="|"):
+    """
+    Prints the load time of the csv with ast.literal_eval against the parquet file, as lists and as arrays
+    """
+    results = {}
+
+    start = time.perf_counter()
+    df = pd.read_csv(csv_fn, sep=sep)
+    for column in LIST_COLUMNS:
+        if column in df:
+            df[column] = df[column].apply(ast.literal_eval)
+    results['csv + literal_eval'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_annotated(fn)
+    results['parquet, lists'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for column in pq.read_schema(fn).names:
+        if column in LIST_COLUMNS:
+            read_list_column(fn, column)
+    results['parquet, arrays'] = time.perf_counter() - start
+
+    for name, seconds in results.items():
+        print("{:<20} {:>8.3f}s  {:>6.1f}x".format(name, seconds, results['csv + literal_eval'] / seconds))
+    print("{:<20} {:>8.1f} MB -> {:.1f} MB".format('size', os.path.getsize(csv_fn) / 1e6, os.path.getsize(fn) / 1e6))
+
+    return results
+
+if __name__ == "__main__":
+    if not os.path.isfile(ANNOTATED_FN):
+        convert_annotated_csv()
+    benchmark_load()
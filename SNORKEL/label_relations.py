@@ -1,11 +1,18 @@
+import os
+import sys
 from Load_data import load_data
 from extract_relations import *
+from annotated_store import write_annotated
+
+# sections.py is shared with the annotation scripts in the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sections import RELEVANT_SECTIONS
 
 def combine_lists(list1, list2):
     return [list2[i] if list1[i] == "NEGATIVE" else list1[i] for i in range(len(list1))]
 
-# Load dataframe
-df = load_data()
+# Load dataframe, the relations are found in the facts, the law and the operative provisions
+df = load_data(sections=RELEVANT_SECTIONS)
 
 # Load all relation extracting functions
 relation_functions = [get_DATE_COURT, get_PERSON_PERSON, get_PERSON_DATE, get_PERSON_GPE,
@@ -33,5 +40,5 @@ for i, fn in enumerate(relation_functions):
 # Add relation
 df['Relation'] = label
 
-# Save
-df.to_csv("annotated_all.csv", sep="|")
+# Save with native list columns, see annotated_store.py
+write_annotated(df, "annotated_all.parquet")
@@ -0,0 +1,108 @@
+import weakref
+import numpy as np
+from tag_codebook import codebook as default_codebook
+
+def as_types(types):
+    # An entity type or a list of entity types
+    return [types] if isinstance(types, str) else list(types)
+
+class MentionIndex:
+    """
+    All entity mentions of a corpus as columnar arrays (sentence, entity type, start, end), built once from
+    the flat tag codes. A mention starts at a begin tag and runs over the inside tags of the same type.
+    Mentions are sorted by type, then sentence, then start, so the mentions of a type are one slice
+    """
+    def __init__(self, codes, offsets, codebook=default_codebook):
+        self.codebook = codebook
+        self.n_sentences = len(offsets) - 1
+        codes = np.asarray(codes)
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        types = codebook.entity_type[codes]
+        starts = np.flatnonzero(codebook.is_begin[codes])
+
+        # A mention ends at the first token that does not continue it: another type, a begin tag or a new sentence
+        breaks = np.ones(len(codes) + 1, dtype=bool)
+        breaks[1:-1] = (types[1:] != types[:-1]) | codebook.is_begin[codes[1:]]
+        breaks[offsets] = True
+        break_positions = np.flatnonzero(breaks)
+        ends = break_positions[np.searchsorted(break_positions, starts, side='right')]
+
+        sentences = np.searchsorted(offsets, starts, side='right') - 1
+        mention_types = types[starts]
+
+        order = np.lexsort((starts, sentences, mention_types))
+        self.sentence = sentences[order]
+        self.entity_type = mention_types[order]
+        self.start = (starts - offsets[sentences])[order]
+        self.end = (ends - offsets[sentences])[order]
+
+        # Slice of every type id in the sorted arrays
+        self.type_bounds = np.searchsorted(self.entity_type, np.arange(len(codebook.types) + 2))
+
+    @classmethod
+    def from_df(cls, df, codebook=default_codebook):
+        # From the Tag_code column added by Load_data.load_data
+        lengths = df['Tag_code'].map(len).to_numpy()
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        codes = np.concatenate(list(df['Tag_code'])) if len(lengths) else np.zeros(0, dtype=np.int8)
+        return cls(codes, offsets, codebook)
+
+    def __len__(self):
+        return len(self.sentence)
+
+    def type_slice(self, entity_type):
+        type_id = self.codebook.type_ids.get(entity_type)
+        if type_id is None:
+            return slice(0, 0)
+        return slice(self.type_bounds[type_id], self.type_bounds[type_id + 1])
+
+    def mentions(self, types):
+        """
+        (sentence, entity_type, start, end) arrays of the mentions of the given types, by sentence and start
+        """
+        parts = [self.type_slice(entity_type) for entity_type in as_types(types)]
+        index = np.concatenate([np.arange(part.start, part.stop) for part in parts]) if parts else np.zeros(0, int)
+        if len(parts) > 1:
+            index = index[np.lexsort((self.start[index], self.sentence[index]))]
+
+        return self.sentence[index], self.entity_type[index], self.start[index], self.end[index]
+
+    def first_mentions(self, types, exclude=()):
+        """
+        Start of the first mention of the given types (that is not one of exclude) in every sentence, -1 for
+        sentences without one
+        """
+        exclude = set(as_types(exclude))
+        types = [entity_type for entity_type in as_types(types) if entity_type not in exclude]
+        sentences, _, starts, _ = self.mentions(types)
+        first = np.full(self.n_sentences, -1, dtype=np.int64)
+        # Mentions are sorted by sentence and start, so the first one of every sentence is where it first appears
+        found, index = np.unique(sentences, return_index=True)
+        first[found] = starts[index]
+
+        return first
+
+    def candidates(self, types1, types2):
+        """
+        For every sentence the first mention of types1 and the first mention of types2 (that is not one of
+        types1), both -1 unless the sentence has both; the candidates of the labeling functions. Both can be
+        an entity type or a list of them
+        """
+        ids1 = self.first_mentions(types1)
+        ids2 = self.first_mentions(types2, exclude=types1)
+        both = (ids1 != -1) & (ids2 != -1)
+
+        return np.where(both, ids1, -1), np.where(both, ids2, -1)
+
+# Index of the last DataFrame it was built for, the relation functions all query the same one
+cached = {}
+
+def get_mention_index(df):
+    ref = cached.get('df')
+    if ref is None or ref() is not df or cached['n_rows'] != df.shape[0]:
+        cached['df'] = weakref.ref(df)
+        cached['n_rows'] = df.shape[0]
+        cached['index'] = MentionIndex.from_df(df)
+
+    return cached['index']
@@ -0,0 +1,143 @@
+import json
+import os
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from annotated_store import ANNOTATED_FN, padded, read_list_column, read_table
+from tag_codebook import TagCodebook, codebook
+
+# Folder with the flat arrays of the labeled dataset
+RAGGED_DIR = "annotated_all_ragged"
+
+def source_info(fn):
+    # Identifies the version of annotated_all.parquet a store was built from
+    stat = os.stat(fn)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'rows': pq.read_metadata(fn).num_rows}
+
+def is_current(fn=ANNOTATED_FN, folder=RAGGED_DIR):
+    """
+    Whether the store in folder was built from the current version of fn
+    """
+    try:
+        with open(os.path.join(folder, "source.json")) as f:
+            return json.load(f) == source_info(fn)
+    except (OSError, ValueError):
+        return False
+
+def write_ragged(folder, tokens, tags, offsets, tag_types):
+    """
+    Writes flat token ids, tag codes and the int64 row offsets into them as .npy files, plus the entity
+    types of the tag codebook
+    """
+    os.makedirs(folder, exist_ok=True)
+    # An interrupted rebuild leaves the store stale
+    if os.path.isfile(os.path.join(folder, "source.json")):
+        os.remove(os.path.join(folder, "source.json"))
+    for name, array in [('tokens', tokens), ('tags', tags), ('offsets', offsets)]:
+        tmp_fn = os.path.join(folder, name + ".tmp.npy")
+        np.save(tmp_fn, array)
+        os.replace(tmp_fn, os.path.join(folder, name + ".npy"))
+    with open(os.path.join(folder, "tags.json"), 'w') as f:
+        json.dump(tag_types, f)
+
+def build_ragged_store(fn=ANNOTATED_FN, folder=RAGGED_DIR):
+    """
+    Builds the ragged store from annotated_all.parquet, without going through Python lists
+    """
+    source = source_info(fn)
+    tokens, offsets = read_list_column(fn, 'Word_idx')
+
+    # Every distinct tag string is looked up in the codebook once
+    tags = read_table(fn, ['Tag']).column('Tag').combine_chunks()
+    tag_offsets = tags.offsets.to_numpy()
+    if not np.array_equal(tag_offsets - tag_offsets[0], offsets):
+        raise ValueError("{}: Word_idx and Tag are not aligned".format(fn))
+    encoded = pc.dictionary_encode(tags.flatten())
+    lookup = codebook.encode(encoded.dictionary.to_pylist())
+    tag_codes = lookup[encoded.indices.to_numpy()]
+
+    write_ragged(folder, tokens.astype(np.int32), tag_codes, offsets.astype(np.int64), codebook.types)
+    with open(os.path.join(folder, "source.json"), 'w') as f:
+        json.dump(source, f)
+
+    return len(offsets) - 1
+
+def load_ragged_store(fn=ANNOTATED_FN, folder=RAGGED_DIR):
+    """
+    The ragged store of fn, rebuilt first when fn changed since it was built
+    """
+    if not is_current(fn, folder):
+        build_ragged_store(fn, folder)
+
+    return RaggedDataset(folder)
+
+class RaggedDataset:
+    """
+    Sentences of the labeled dataset as memory-mapped flat arrays. A sentence or a range of sentences is a
+    view on the mapped files; only padded batches are copied. Works as a map-style dataset for a PyTorch
+    DataLoader (with collate as collate_fn) and as a batch generator for Keras
+    """
+    def __init__(self, folder=RAGGED_DIR):
+        self.folder = folder
+        self.tokens = np.load(os.path.join(folder, "tokens.npy"), mmap_mode='r')
+        self.tags = np.load(os.path.join(folder, "tags.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(folder, "offsets.npy"), mmap_mode='r')
+        # The codebook the tags were written with
+        with open(os.path.join(folder, "tags.json")) as f:
+            self.codebook = TagCodebook(json.load(f))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        # Token ids and tag codes of sentence i
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.tokens[start:end], self.tags[start:end]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def slice(self, start, stop):
+        """
+        Tokens, tags and offsets (starting at 0) of sentences start to stop, without copying
+        """
+        lo, hi = self.offsets[start], self.offsets[stop]
+        return self.tokens[lo:hi], self.tags[lo:hi], self.offsets[start:stop + 1] - lo
+
+    def padded(self, indices=None, max_length=128, column='tokens'):
+        """
+        Padded or truncated rows of the given sentences (all sentences by default) as one array
+        """
+        values = self.tokens if column == 'tokens' else self.tags
+        if indices is None:
+            return padded(values, np.asarray(self.offsets), max_length)
+
+        indices = np.asarray(indices)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        # Gather the rows into a new ragged array first, only the selected tokens are read
+        batch_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        positions = np.repeat(starts - batch_offsets[:-1], lengths) + np.arange(batch_offsets[-1])
+
+        return padded(values[positions], batch_offsets, max_length)
+
+    def batches(self, indices=None, labels=None, batch_size=32, max_length=128, shuffle=False, seed=None):
+        """
+        Yields padded token batches (with their labels, if given) for model.fit or a training loop
+        """
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        if shuffle:
+            indices = np.random.RandomState(seed).permutation(indices)
+        for i in range(0, len(indices), batch_size):
+            batch = indices[i:i + batch_size]
+            X = self.padded(batch, max_length)
+            yield X if labels is None else (X, labels[batch])
+
+def collate(items, max_length=128):
+    # Pads a list of (tokens, tags) items of a RaggedDataset, to use as collate_fn of a DataLoader
+    lengths = np.array([len(tokens) for tokens, _ in items], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    tokens = np.concatenate([tokens for tokens, _ in items]) if items else np.zeros(0, dtype=np.int32)
+    tags = np.concatenate([tags for _, tags in items]) if items else np.zeros(0, dtype=np.int8)
+
+    return padded(tokens, offsets, max_length), padded(tags, offsets, max_length)
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Entity types of the regex rules (base_labels of the NER notebook) and of the spaCy model, plus RULE
+ENTITY_TYPES = ['LAW', 'CARDINAL', 'DATE', 'GPE', 'ORG', 'WORK_OF_ART', 'PERSON', 'NORP', 'LOC', 'COURT',
+                'CASE', 'JUDGE', 'REGISTRAR', 'APPLICATION', 'ARTICLE', 'SECTION', 'PARAGRAPH', 'PROTOCOL',
+                'VICTIMS', 'INVESTIGATORS', 'STATEMENTS', 'SECRETARY', 'LAWYER', 'DEFENDANT', 'PROSECUTOR',
+                'PETITION', 'MONEY', 'PERCENT', 'TIME', 'QUANTITY', 'ORDINAL', 'FAC', 'PRODUCT', 'EVENT',
+                'LANGUAGE', 'RULE']
+
+# Codes have to fit in int8: 'O' and a begin and an inside code per type
+MAX_TYPES = 63
+
+class TagCodebook:
+    """
+    Maps BIO tags ('B-DATE', 'B DATE', 'I COURT', 'O') to int8 codes: 0 is 'O', type k (1-based) has the
+    begin code 2k - 1 and the inside code 2k. is_begin and entity_type are lookup tables indexed by code.
+    Types that are not in the codebook yet are added when encoding
+    """
+    def __init__(self, types=ENTITY_TYPES):
+        self.types = []
+        self.type_ids = {}
+        self.tag_codes = {'O': 0, '': 0}
+        for entity_type in types:
+            self.add_type(entity_type)
+
+    def add_type(self, entity_type):
+        if entity_type in self.type_ids:
+            return self.type_ids[entity_type]
+        if len(self.types) >= MAX_TYPES:
+            raise ValueError("No int8 code left for entity type {}".format(entity_type))
+
+        self.types.append(entity_type)
+        type_id = len(self.types)
+        self.type_ids[entity_type] = type_id
+
+        # Lookup tables, indexed by code
+        self.is_begin = np.array([False] + [True, False] * len(self.types))
+        self.entity_type = np.repeat(np.arange(len(self.types) + 1, dtype=np.int8), [1] + [2] * len(self.types))
+
+        return type_id
+
+    def __len__(self):
+        return 2 * len(self.types) + 1
+
+    def code(self, tag):
+        code = self.tag_codes.get(tag)
+        if code is None:
+            # 'B-DATE' or 'B DATE', B and U start an entity, every other prefix continues one
+            prefix, _, entity_type = tag.replace('-', ' ', 1).partition(' ')
+            if not entity_type:
+                prefix, entity_type = 'B', prefix
+            code = 2 * self.add_type(entity_type) - (1 if prefix in ('B', 'U') else 0)
+            self.tag_codes[tag] = code
+
+        return code
+
+    def encode(self, tags):
+        return np.fromiter((self.code(tag) for tag in tags), dtype=np.int8, count=len(tags))
+
+    def encode_rows(self, rows):
+        """
+        Flat codes of all rows and the offsets of the rows in them
+        """
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        codes = np.fromiter((self.code(tag) for row in rows for tag in row), dtype=np.int8, count=offsets[-1])
+
+        return codes, offsets
+
+    def decode(self, codes, sep='-'):
+        names = ['O'] + ["{}{}{}".format(prefix, sep, entity_type)
+                         for entity_type in self.types for prefix in ('B', 'I')]
+        return [names[code] for code in codes]
+
+    def type_mask(self, types):
+        # Boolean table indexed by code, True for the begin and inside codes of the given types
+        mask = np.zeros(len(self), dtype=bool)
+        for entity_type in types:
+            type_id = self.type_ids.get(entity_type)
+            if type_id is not None:
+                mask[2 * type_id - 1:2 * type_id + 1] = True
+        return mask
+
+    def begin_mask(self, types):
+        return self.type_mask(types) & self.is_begin
+
+# Codebook shared by the labeling and training scripts
+codebook = TagCodebook()
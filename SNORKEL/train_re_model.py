@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder, OneHotEncoder
 from tensorflow.keras import Sequential
@@ -9,26 +8,21 @@ import matplotlib.pyplot as plt
 from imblearn.under_sampling import RandomUnderSampler
 from sklearn.metrics import f1_score, accuracy_score, precision_score, recall_score
 from snorkel.utils import probs_to_preds
-import ast
-
-# Pad or truncate sentences
-def pad_or_truncate(l, max_length=128):
-    return l[:max_length] + [0] * (max_length - len(l))
+from annotated_store import read_annotated
+from ragged_store import load_ragged_store
 
 # LOAD DATA
-# Load created train set
-df = pd.read_csv("annotated_all.csv", sep="|")
-
-# Set correct type for list
-df['Word'] = df['Word'].apply(ast.literal_eval)
-df['Word_idx'] = df['Word_idx'].apply(ast.literal_eval)
-df['Tag'] = df['Tag'].apply(ast.literal_eval)
+# Load created train set, the token ids are memory-mapped from the ragged store (rebuilt when
+# annotated_all.parquet changed)
+sentences = load_ragged_store()
+df = read_annotated(columns=['Relation'])
 
 # Remove labels if they don't occur enough (800 times, for undersampling later on)
-df = df[df.Relation.isin(list(df.Relation.value_counts().loc[lambda x: x > 800].index))].reset_index(drop=True)
+keep = df.Relation.isin(list(df.Relation.value_counts().loc[lambda x: x > 800].index)).to_numpy()
+df = df[keep].reset_index(drop=True)
 
 # Create padded / truncated input
-X = np.array(list(map(pad_or_truncate, df.Word_idx)))
+X = sentences.padded(np.flatnonzero(keep), max_length=128)
 
 # Create one hot encoding for relations
 label_encoder = LabelEncoder()
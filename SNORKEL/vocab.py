@@ -0,0 +1,47 @@
+import json
+import os
+from collections import Counter
+
+# Reserved ids, 0 is also the padding value of pad_or_truncate
+PAD = '<PAD>'
+UNK = '<UNK>'
+
+# Vocabulary of the words of annotated_all
+VOCAB_FN = "vocab.json"
+
+def build_vocab(sequences, min_count=1, max_size=None, specials=(PAD, UNK)):
+    """
+    Counts the tokens of a stream of sentences and returns the vocabulary as a list: the specials first, then
+    the tokens seen at least min_count times, most frequent first and alphabetically within a count, so the
+    ids are the same on every run
+    """
+    counts = Counter()
+    for sequence in sequences:
+        counts.update(sequence)
+
+    tokens = sorted((tok for tok, count in counts.items() if count >= min_count and tok not in specials),
+                    key=lambda tok: (-counts[tok], tok))
+    if max_size is not None:
+        tokens = tokens[:max_size - len(specials)]
+
+    return list(specials) + tokens
+
+def save_vocab(vocab, fn=VOCAB_FN):
+    tmp_fn = fn + ".tmp"
+    with open(tmp_fn, 'w') as f:
+        json.dump(vocab, f)
+    os.replace(tmp_fn, fn)
+
+def load_vocab(fn=VOCAB_FN):
+    with open(fn) as f:
+        return json.load(f)
+
+def load_or_build_vocab(sequences, fn=VOCAB_FN, **kwargs):
+    # A saved vocabulary is reused, so cached arrays and saved models keep matching ids
+    if os.path.isfile(fn):
+        return load_vocab(fn)
+
+    vocab = build_vocab(sequences, **kwargs)
+    save_vocab(vocab, fn)
+
+    return vocab
@@ -1,52 +1,555 @@
-import requests
+import asyncio
+import hashlib
+import inspect
+import json
+import sys
+import time
+from urllib.parse import quote
+import aiohttp
 from tqdm import tqdm
+from telemetry import AdaptiveConcurrency, DownloadTelemetry
+from catalog import CATALOG_FN, build_catalog, entry_matches, read_checkpoint_entries, select_ids
 from pathlib import Path
 import os
+import zipfile
 
-def get_ids():
-    # Basic query_url
-    query_url = "https://hudoc.echr.coe.int/app/query/results?query=contentsitename%3AECHR%20AND%20(NOT%20(doctype%3DPR%20OR%20doctype%3DHFCOMOLD%20OR%20doctype%3DHECOMOLD))%20AND%20((languageisocode%3D%22ENG%22))%20AND%20((documentcollectionid%3D%22GRANDCHAMBER%22)%20OR%20(documentcollectionid%3D%22CHAMBER%22))&select=sharepointid,Rank,ECHRRanking,languagenumber,itemid,docname,doctype,application,appno,conclusion,importance,originatingbody,typedescription,kpdate,kpdateAsText,documentcollectionid,documentcollectionid2,languageisocode,extractedappno,isplaceholder,doctypebranch,respondent,ecli,appnoparts,sclappnos,echradvopidentifier,echradvopstatus&sort=&rankingModelId=11111111-0000-0000-0000-000000000000"
+# Basic query_url
+QUERY_URL = "https://hudoc.echr.coe.int/app/query/results?query=contentsitename%3AECHR%20AND%20(NOT%20(doctype%3DPR%20OR%20doctype%3DHFCOMOLD%20OR%20doctype%3DHECOMOLD))%20AND%20((languageisocode%3D%22ENG%22))%20AND%20((documentcollectionid%3D%22GRANDCHAMBER%22)%20OR%20(documentcollectionid%3D%22CHAMBER%22))&select=sharepointid,Rank,ECHRRanking,languagenumber,itemid,docname,doctype,application,appno,conclusion,importance,originatingbody,typedescription,kpdate,kpdateAsText,documentcollectionid,documentcollectionid2,languageisocode,extractedappno,isplaceholder,doctypebranch,respondent,ecli,appnoparts,sclappnos,echradvopidentifier,echradvopstatus&sort=&rankingModelId=11111111-0000-0000-0000-000000000000"
 
-    # Query no entries (to see how many exist entries exist)
-    req = requests.get("https://hudoc.echr.coe.int/app/query/results?query=contentsitename%3AECHR%20AND%20(NOT%20(doctype%3DPR%20OR%20doctype%3DHFCOMOLD%20OR%20doctype%3DHECOMOLD))%20AND%20((languageisocode%3D%22ENG%22))%20AND%20((documentcollectionid%3D%22GRANDCHAMBER%22)%20OR%20(documentcollectionid%3D%22CHAMBER%22))&select=sharepointid,Rank,ECHRRanking,languagenumber,itemid,docname,doctype,application,appno,conclusion,importance,originatingbody,typedescription,kpdate,kpdateAsText,documentcollectionid,documentcollectionid2,languageisocode,extractedappno,isplaceholder,doctypebranch,respondent,ecli,appnoparts,sclappnos,echradvopidentifier,echradvopstatus&sort=&rankingModelId=11111111-0000-0000-0000-000000000000")
-    number_of_entries = req.json()['resultcount']
+# High-water mark of the last delta sync
+SYNC_STATE_FN = os.path.join('Checkpoints', 'sync_state.json')
 
-    # For every entries, load them and add ids to list
-    ids_lst = []
-    for i in tqdm(range(0, number_of_entries, 500), desc="Loading all ids"):
-        # Get request and transform to Jason
-        req_json = requests.get(query_url + "&start={}&length=500".format(i)).json()
+# Size, hash and validators of every downloaded file, stored next to the files
+MANIFEST_FN = 'manifest.jsonl'
 
-        # Add id to list
-        for entry in req_json['results']:
-            ids_lst.append(entry['columns']['itemid'])
+# Latency histograms, throughput, retries and errors of the last sync (.json and .prom)
+METRICS_FN = os.path.join('Metrics', 'scraper')
 
-    return ids_lst
+# Query link to get docx files
+DOCX_URL = "http://hudoc.echr.coe.int/app/conversion/docx/?library=ECHR&filename=thank_you.docx&id="
 
-def get_docx(ids_lst):
-    # Query link to get docx files
-    docx_url = "http://hudoc.echr.coe.int/app/conversion/docx/?library=ECHR&filename=thank_you.docx&id="
+async def fetch_json(session, url, retries=3, backoff=1.0):
+    """
+    Loads a query result page as json, retrying with exponential backoff on failures
+    """
+    for attempt in range(retries + 1):
+        try:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                return await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
 
+def write_json_atomic(fn, data):
+    # Write to a temporary file first, so a crash never leaves half a checkpoint behind
+    tmp_fn = fn + ".tmp"
+    with open(tmp_fn, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_fn, fn)
+
+def read_page_checkpoints(checkpoint_dir, query_url, number_of_entries, length):
+    # Pages are only valid for the query, result count and page length they were created with
+    meta_fn = os.path.join(checkpoint_dir, "meta.json")
+    meta = {'query_url': query_url, 'resultcount': number_of_entries, 'length': length}
+    if os.path.isfile(meta_fn):
+        with open(meta_fn) as f:
+            if json.load(f) != meta:
+                for fn in os.listdir(checkpoint_dir):
+                    if fn.startswith("page_"):
+                        os.remove(os.path.join(checkpoint_dir, fn))
+    write_json_atomic(meta_fn, meta)
+
+    # Load every finished page
+    pages = {}
+    for fn in os.listdir(checkpoint_dir):
+        if fn.startswith("page_") and fn.endswith(".json"):
+            with open(os.path.join(checkpoint_dir, fn)) as f:
+                pages[int(fn[5:-5])] = json.load(f)
+
+    return pages
+
+async def iter_entries(query_url=QUERY_URL, checkpoint_dir=os.path.join('Checkpoints', 'ids'), concurrency=8,
+                       length=500, retries=3, backoff=1.0, timeout=60, stats=None):
+    """
+    Yields the selected columns of all entries, fetching result pages concurrently and checkpointing every
+    finished page to disk. The start of every page that could not be loaded is put in stats['failed_pages']
+    """
+    Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        # Query a single entry (to see how many entries exist)
+        req_json = await fetch_json(session, query_url + "&start=0&length=1", retries, backoff)
+        number_of_entries = req_json['resultcount']
+
+        # First hand out the ids of the pages finished in an earlier run
+        pages = read_page_checkpoints(checkpoint_dir, query_url, number_of_entries, length)
+        for start in sorted(pages):
+            for columns in pages[start]:
+                yield columns
+
+        # Then fetch the missing pages concurrently
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_page(start):
+            async with semaphore:
+                req_json = await fetch_json(session, query_url + "&start={}&length={}".format(start, length),
+                                            retries, backoff)
+
+            # Keep all selected columns, not only the id
+            columns = [entry['columns'] for entry in req_json['results']]
+            write_json_atomic(os.path.join(checkpoint_dir, "page_{}.json".format(start)), columns)
+            return columns
+
+        missing = [start for start in range(0, number_of_entries, length) if start not in pages]
+        failed = []
+
+        async def fetch_or_fail(start):
+            try:
+                return await fetch_page(start)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                failed.append(start)
+                return None
+
+        for task in tqdm(asyncio.as_completed([fetch_or_fail(start) for start in missing]),
+                         total=len(missing), desc="Loading all ids"):
+            columns = await task
+            if columns is None:
+                continue
+
+            # Stream entries as soon as their page arrives
+            for entry in columns:
+                yield entry
+
+        if stats is not None:
+            stats['failed_pages'] = sorted(failed)
+        if failed:
+            print("{} pages not loaded, run again to fetch them.".format(len(failed)))
+
+async def iter_ids(**kwargs):
+    async for entry in iter_entries(**kwargs):
+        yield entry['itemid']
+
+def get_ids(**kwargs):
+    async def collect():
+        return [entry_id async for entry_id in iter_ids(**kwargs)]
+
+    return asyncio.run(collect())
+
+def file_entry(entry_id, fn, etag=None, last_modified=None):
+    # Size and hash of a finished file, as recorded in the manifest
+    sha = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return {'itemid': entry_id, 'size': os.path.getsize(fn), 'sha256': sha.hexdigest(), 'etag': etag,
+            'last_modified': last_modified}
+
+def load_manifest(folder='Files'):
+    # The manifest is an append-only log, the last line of every id wins
+    manifest = {}
+    fn = os.path.join(folder, MANIFEST_FN)
+    if os.path.isfile(fn):
+        with open(fn) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash while appending can leave a broken last line
+                    continue
+                manifest[entry['itemid']] = entry
+
+    return manifest
+
+def is_complete(fn, entry, verify=False):
+    # Check a file on disk against its manifest entry
+    if entry is None or not os.path.isfile(fn) or os.path.getsize(fn) != entry['size']:
+        return False
+
+    return not verify or file_entry(entry['itemid'], fn)['sha256'] == entry['sha256']
+
+def read_part_validators(part_fn):
+    # ETag and Last-Modified of the response a partial file was started from
+    try:
+        with open(part_fn + ".json") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {'etag': None, 'last_modified': None}
+
+    return {'etag': meta.get('etag'), 'last_modified': meta.get('last_modified')}
+
+def read_part_validator(part_fn):
+    # The If-Range value of a partial file, None if it cannot be resumed safely. If-Range needs a strong ETag
+    validators = read_part_validators(part_fn)
+    etag = validators['etag'] if validators['etag'] and not validators['etag'].startswith('W/') else None
+    return etag or validators['last_modified']
+
+def remove_part(part_fn):
+    for name in (part_fn, part_fn + ".json"):
+        if os.path.isfile(name):
+            os.remove(name)
+
+def finish_part(entry_id, part_fn, fn, validators):
+    # Only a complete docx (a valid zip archive) replaces the file, a mismatched resume is thrown away
+    if not zipfile.is_zipfile(part_fn):
+        remove_part(part_fn)
+        raise ValueError("{}: downloaded file is not a valid docx".format(entry_id))
+    os.replace(part_fn, fn)
+    remove_part(part_fn)
+
+    return file_entry(entry_id, fn, **validators)
+
+async def download_docx(session, entry_id, fn, limiter, telemetry, docx_url=DOCX_URL, cached=None, retries=3,
+                        backoff=1.0, chunk_size=64 * 1024):
+    """
+    Streams a single docx file to a temporary file and renames it when complete. Partial files are resumed
+    with a range request (guarded by If-Range, so a changed document is sent whole) and known files are
+    revalidated with a conditional request. Returns the manifest entry, or None when all retries failed
+    """
+    part_fn = fn + ".part"
+    for attempt in range(retries + 1):
+        # A docx is already compressed; byte ranges and Content-Length only match the file on disk without a
+        # content encoding
+        headers = {'Accept-Encoding': 'identity'}
+
+        # Only ask for the document if it changed since we stored it
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        # Continue where an earlier attempt stopped, if we know which version of the document it holds
+        offset = os.path.getsize(part_fn) if os.path.isfile(part_fn) else 0
+        validator = read_part_validator(part_fn) if offset else None
+        if offset and validator is None:
+            remove_part(part_fn)
+            offset = 0
+        if offset:
+            headers['Range'] = "bytes={}-".format(offset)
+            headers['If-Range'] = validator
+
+        # Wait for a free slot of the adaptive concurrency limit
+        await limiter.acquire()
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with session.get(docx_url + entry_id, headers=headers) as resp:
+                if resp.status == 304:
+                    ok = True
+                    telemetry.observe_request(time.perf_counter() - started, resp.status)
+                    return dict(cached, status='not_modified')
+
+                # The partial file already holds the whole document
+                if resp.status == 416 and offset:
+                    entry = finish_part(entry_id, part_fn, fn, read_part_validators(part_fn))
+                    ok = True
+                    telemetry.observe_request(time.perf_counter() - started, resp.status)
+                    return dict(entry, status='downloaded')
+                resp.raise_for_status()
+
+                validators = {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+                # The server may ignore the range, or send the whole file again because the document changed. A
+                # range of an encoded body cannot be appended to the decoded part
+                encoded = resp.headers.get('Content-Encoding', 'identity') != 'identity'
+                if resp.status == 206 and encoded:
+                    remove_part(part_fn)
+                    raise ValueError("{}: range response with a content encoding".format(entry_id))
+                if resp.status == 206 and resp.headers.get('Content-Range', '').startswith("bytes {}-".format(offset)):
+                    mode = 'ab'
+                else:
+                    offset = 0
+                    mode = 'wb'
+                    # Remember the version, so a resume of this file is only accepted for the same one
+                    remove_part(part_fn)
+                    if validators['etag'] or validators['last_modified']:
+                        write_json_atomic(part_fn + ".json", validators)
+
+                # Save request chunk by chunk
+                with open(part_fn, mode) as f:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+
+                # A short read is a failed download, not a finished one. Content-Length counts the encoded bytes
+                # when the server compressed the body anyway, aiohttp writes them decoded
+                size = os.path.getsize(part_fn)
+                if resp.content_length is not None and not encoded and size != offset + resp.content_length:
+                    remove_part(part_fn)
+                    raise ValueError("{}: expected {} bytes, got {}".format(entry_id, offset + resp.content_length, size))
+
+                if mode == 'ab':
+                    validators = read_part_validators(part_fn)
+                entry = finish_part(entry_id, part_fn, fn, validators)
+                ok = True
+                telemetry.observe_request(time.perf_counter() - started, resp.status, size - offset)
+                return dict(entry, status='downloaded')
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            if isinstance(e, aiohttp.ClientResponseError):
+                telemetry.observe_request(time.perf_counter() - started, e.status)
+            telemetry.observe_error(e)
+        finally:
+            await limiter.release(time.perf_counter() - started, ok)
+            telemetry.concurrency = limiter.limit
+
+        # The partial file is kept, so the next attempt resumes from it
+        if attempt == retries:
+            return None
+        telemetry.retries += 1
+        await asyncio.sleep(backoff * 2 ** attempt)
+
+async def export_metrics(telemetry, metrics_fn, interval):
+    # Keep the metrics files up to date while a long sync is running
+    while True:
+        await asyncio.sleep(interval)
+        telemetry.export(metrics_fn)
+
+async def download_all(ids_lst, folder='Files', docx_url=DOCX_URL, concurrency=16, retries=3, backoff=1.0,
+                       chunk_size=64 * 1024, timeout=60, revalidate=False, verify=False, adaptive=True,
+                       telemetry=None, metrics_fn=None, export_interval=30, on_file=None):
+    """
+    Downloads all ids over one pooled keep-alive session with at most `concurrency` requests in flight.
+    With adaptive set, the number of requests in flight is tuned between 1 and `concurrency` from the
+    error rate and latency. Files whose size (and hash, with verify) match the manifest are skipped, or
+    revalidated with a conditional request when revalidate is set. on_file(entry_id, fn, result) is called
+    for every file that is on disk afterwards, with result 'downloaded', 'skipped' or 'not_modified'; if it
+    returns an awaitable, the worker waits for it before taking the next id
+    """
+    stats = {'downloaded': 0, 'skipped': 0, 'not_modified': 0, 'failed': [], 'new': [], 'bytes': 0}
+    manifest = load_manifest(folder)
+    if adaptive:
+        limiter = AdaptiveConcurrency(concurrency)
+    else:
+        limiter = AdaptiveConcurrency(concurrency, min_limit=concurrency, initial=concurrency)
+    telemetry = telemetry if telemetry is not None else DownloadTelemetry()
+
+    # A single connector is shared by every request, so connections are reused
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    queue = asyncio.Queue(maxsize=concurrency * 4)
+
+    with open(os.path.join(folder, MANIFEST_FN), 'a') as manifest_file:
+        def record(entry):
+            manifest[entry['itemid']] = entry
+            manifest_file.write(json.dumps(entry) + "\n")
+            manifest_file.flush()
+
+        async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+            progress = tqdm(desc="Downloading all files")
+
+            async def fetch(entry_id):
+                # Create a filename
+                fn = os.path.join(folder, "{}.docx".format(entry_id))
+                cached = manifest.get(entry_id)
+
+                # Files downloaded before the manifest existed are adopted if they are valid docx files
+                if cached is None and os.path.isfile(fn) and zipfile.is_zipfile(fn):
+                    cached = file_entry(entry_id, fn)
+                    record(cached)
+
+                # Anything that does not match the manifest is fetched again from scratch
+                if not is_complete(fn, cached, verify):
+                    cached = None
+
+                if cached is not None and not revalidate:
+                    stats['skipped'] += 1
+                    result = 'skipped'
+                else:
+                    entry = await download_docx(session, entry_id, fn, limiter, telemetry, docx_url, cached,
+                                                retries, backoff, chunk_size)
+                    if entry is None:
+                        stats['failed'].append(entry_id)
+                        return
+                    elif entry.pop('status') == 'not_modified':
+                        stats['not_modified'] += 1
+                        result = 'not_modified'
+                    else:
+                        record(entry)
+                        stats['downloaded'] += 1
+                        stats['new'].append(entry_id)
+                        stats['bytes'] += entry['size']
+                        result = 'downloaded'
+
+                # Hand the file to the next pipeline stage, which can hold up this worker by returning an awaitable
+                if on_file is not None:
+                    handed_off = on_file(entry_id, fn, result)
+                    if inspect.isawaitable(handed_off):
+                        await handed_off
+
+            async def worker():
+                while True:
+                    entry_id = await queue.get()
+                    if entry_id is None:
+                        return
+
+                    # A disk error or a failing next stage only fails this id, the worker keeps going
+                    try:
+                        await fetch(entry_id)
+                    except Exception as e:
+                        print("{} failed: {!r}".format(entry_id, e))
+                        telemetry.observe_error(e)
+                        stats['failed'].append(entry_id)
+                    progress.update(1)
+                    progress.set_postfix(limit=limiter.limit)
+
+            # Bounded pool of workers pulling ids from the queue
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            exporter = asyncio.create_task(export_metrics(telemetry, metrics_fn, export_interval)) if metrics_fn else None
+            if hasattr(ids_lst, '__aiter__'):
+                # Ids are streamed in while they are still being harvested
+                async for entry_id in ids_lst:
+                    await queue.put(entry_id)
+            else:
+                for entry_id in ids_lst:
+                    await queue.put(entry_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            progress.close()
+            if exporter is not None:
+                exporter.cancel()
+
+    # Document level results next to the request level metrics
+    telemetry.documents.update({'downloaded': stats['downloaded'], 'skipped': stats['skipped'],
+                                'not_modified': stats['not_modified'], 'failed': len(stats['failed'])})
+    if metrics_fn:
+        telemetry.export(metrics_fn)
+
+    return stats
+
+def filter_ids(ids_lst, allowed):
+    # Keep only the ids selected from the catalog, for lists as well as streamed ids
+    if hasattr(ids_lst, '__aiter__'):
+        async def filtered():
+            async for entry_id in ids_lst:
+                if entry_id in allowed:
+                    yield entry_id
+        return filtered()
+
+    return [entry_id for entry_id in ids_lst if entry_id in allowed]
+
+def get_docx(ids_lst, folder='Files', docx_url=DOCX_URL, concurrency=16, retries=3, backoff=1.0, where=None,
+             catalog_fn=CATALOG_FN, revalidate=False, verify=False, adaptive=True, metrics_fn=METRICS_FN):
     # Create a folder "Files" if it doesn't exist already
-    Path("/Files").mkdir(parents=True, exist_ok=True)
+    Path(folder).mkdir(parents=True, exist_ok=True)
+
+    # Only download the cases matching the catalog predicates (e.g. where={'importance': 1, 'respondent': 'TUR'}).
+    # Ids that are not in the catalog yet are dropped, streamed entries are filtered with filter_entries instead
+    if where is not None:
+        ids_lst = filter_ids(ids_lst, set(select_ids(catalog_fn, **where)))
+
+    # Download everything concurrently
+    start = time.perf_counter()
+    stats = asyncio.run(download_all(ids_lst, folder, docx_url, concurrency, retries, backoff,
+                                     revalidate=revalidate, verify=verify, adaptive=adaptive, metrics_fn=metrics_fn))
+    elapsed = time.perf_counter() - start
+
+    # Report throughput
+    stats['seconds'] = elapsed
+    stats['docs_per_sec'] = stats['downloaded'] / elapsed if elapsed > 0 else 0.0
+    print("{} files downloaded ({} bytes), {} skipped, {} not modified, {} failed in {:.1f}s ({:.2f} docs/sec)".format(
+        stats['downloaded'], stats['bytes'], stats['skipped'], stats['not_modified'], len(stats['failed']), elapsed,
+        stats['docs_per_sec']))
+
+    return stats
+
+async def filter_entries(entries, where=None):
+    # Item ids of the streamed entries that match the catalog predicates, checked on their own columns
+    async for entry in entries:
+        if where is None or entry_matches(entry, **where):
+            yield entry['itemid']
+
+def delta_query_url(since, query_url=QUERY_URL):
+    # Only select judgments whose kpdate is at or after the high-water mark
+    query, select = query_url.split("&select=", 1)
+    return query + "%20AND%20(kpdate%3E%3D%22{}%22)&select=".format(quote(since)) + select
+
+def load_sync_state(state_fn=SYNC_STATE_FN):
+    if not os.path.isfile(state_fn):
+        return {'kpdate': None}
+    with open(state_fn) as f:
+        return json.load(f)
+
+def sync_state_fn(state_fn=SYNC_STATE_FN, where=None):
+    # Judgments skipped by a predicate fall below its mark, so every predicate set keeps a mark of its own
+    if not where:
+        return state_fn
+    key = hashlib.sha256(json.dumps(where, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    base, extension = os.path.splitext(state_fn)
+    return "{}_{}{}".format(base, key, extension)
+
+def delta_sync(folder='Files', state_fn=SYNC_STATE_FN, manifest_dir='Manifests', query_url=QUERY_URL, where=None,
+               **kwargs):
+    """
+    Downloads only the judgments newer than the stored kpdate high-water mark (and matching the catalog
+    predicates in where) and writes a change manifest listing the new files. Every entry goes to the catalog.
+    A sync with where keeps its own mark, so it never moves the mark of unfiltered syncs past skipped judgments
+    """
+    state_fn = sync_state_fn(state_fn, where)
+    since = load_sync_state(state_fn)['kpdate']
+    if since is not None:
+        query_url = delta_query_url(since, query_url)
+
+    # Remember every entry while streaming the ids to the downloader
+    entries = []
+    kpdates = {}
+    query_stats = {}
+
+    async def delta_entries():
+        async for entry in iter_entries(query_url=query_url, checkpoint_dir=os.path.join('Checkpoints', 'delta'),
+                                        stats=query_stats):
+            entries.append(entry)
+            kpdates[entry['itemid']] = entry['kpdate']
+            yield entry
+
+    # New judgments are not in the catalog yet, so the predicates are checked on the streamed columns
+    stats = get_docx(filter_entries(delta_entries(), where), folder, **kwargs)
+    if entries:
+        build_catalog(entries, kwargs.get('catalog_fn', CATALOG_FN))
+
+    # The entries of a failed result page are unknown, so the mark stays where it was. Failed documents keep
+    # the mark at their kpdate, so they are queried again on the next run
+    if query_stats.get('failed_pages'):
+        mark = since
+    elif stats['failed']:
+        mark = min(kpdates[entry_id] for entry_id in stats['failed'])
+    else:
+        mark = max(kpdates.values(), default=since)
+
+    # Write the change manifest for the downstream annotation and labeling stages
+    Path(manifest_dir).mkdir(parents=True, exist_ok=True)
+    synced_at = time.strftime("%Y%m%dT%H%M%S")
+    manifest_fn = os.path.join(manifest_dir, "delta_{}.json".format(synced_at))
+    write_json_atomic(manifest_fn, {
+        'since': since,
+        'until': mark,
+        'synced_at': synced_at,
+        'items': [{'itemid': entry_id, 'kpdate': kpdates[entry_id],
+                   'file': os.path.join(folder, "{}.docx".format(entry_id))} for entry_id in stats['new']],
+        'failed': stats['failed'],
+        'failed_pages': query_stats.get('failed_pages', []),
+    })
+
+    # Store the new high-water mark
+    Path(state_fn).parent.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(state_fn, {'kpdate': mark, 'where': where})
+    print("{} new judgments since {}, manifest written to {}".format(len(stats['new']), since, manifest_fn))
 
-    # For each id
-    for entry_id in tqdm(ids_lst, "Downloading all files"):
-        # Create a filename
-        fn = os.path.join('Files', "{}.docx".format(entry_id))
+    return manifest_fn
 
-        # If the file does not already exist
-        if not os.path.isfile(fn):
-            # Load request
-            req = requests.get(docx_url + entry_id, stream = True)
+def scrape_all(delta=False, where=None):
+    # Only fetch what is new since the last sync
+    if delta:
+        return delta_sync(where=where)
 
-            # Save request
-            with open(fn, 'wb') as f:
-                for chunk in req.iter_content(1024):
-                    f.write(chunk)
+    # Get all documents (matching where), downloading while the ids are still coming in
+    get_docx(filter_entries(iter_entries(), where))
 
-def scrape_all():
-    # Get all documents
-    get_docx(get_ids())
+    # Keep the metadata of every case in the catalog
+    build_catalog(read_checkpoint_entries(os.path.join('Checkpoints', 'ids')))
 
-scrape_all()
+if __name__ == "__main__":
+    scrape_all(delta="--delta" in sys.argv)
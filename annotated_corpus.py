@@ -0,0 +1,169 @@
+import ast
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from spacy.tokens import DocBin
+from spacy.util import filter_spans
+from nlp_profiles import load_profile
+from ner_rules import base_labels
+from ner_alignment import create_labels
+
+# Entity types of en_core_web_sm that are not part of base_labels, appended so the ids of base_labels stay
+MODEL_LABELS = ['MONEY', 'PERCENT', 'TIME', 'QUANTITY', 'ORDINAL', 'FAC', 'PRODUCT', 'EVENT', 'LANGUAGE']
+MERGE_LABELS = base_labels + [label for label in MODEL_LABELS if label not in base_labels]
+
+# Codebook of the merged BIO tags, 0 is 'O'. Every record batch of a token corpus uses it as the dictionary
+# of its tags, so the dictionary indices are the tag ids
+label_list, label_ids = create_labels(MERGE_LABELS, 'BIO')
+tag_codes = {tag: i for i, tag in enumerate(label_list)}
+TAG_DICTIONARY = pa.array(label_list, pa.string())
+
+# Token level annotations (all_annotated_regex.arrow), one row per sentence
+TOKEN_SCHEMA = pa.schema([
+    ('text', pa.string()),
+    ('words', pa.list_(pa.string())),
+    ('tags', pa.list_(pa.dictionary(pa.int16(), pa.string()))),
+    ('section', pa.string()),
+])
+
+TOKEN_CORPUS_FN = 'all_annotated_regex.arrow'
+
+def parse_list(cell):
+    # List columns are read back from csv as their repr
+    if isinstance(cell, str):
+        return ast.literal_eval(cell)
+    return list(cell)
+
+def tags_array(tags):
+    # Tag rows as a list array of the fixed tag dictionary
+    lengths = np.fromiter((len(row) for row in tags), dtype=np.int32, count=len(tags))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+    try:
+        codes = np.fromiter((tag_codes[tag] for row in tags for tag in row), dtype=np.int16, count=offsets[-1])
+    except KeyError as e:
+        raise ValueError("Tag {} is not in the tag codebook".format(e)) from None
+    values = pa.DictionaryArray.from_arrays(pa.array(codes, pa.int16()), TAG_DICTIONARY)
+
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), values)
+
+# Span group with all entities of a paragraph, doc.ents only keeps the longest non-overlapping ones
+SPANS_KEY = 'entities'
+
+def write_token_corpus(fn, rows, batch_size=4096):
+    """
+    Writes (text, words, tags) or (text, words, tags, section) rows to an Arrow IPC file in record batches,
+    through a temporary file. Tags have to be in the tag codebook
+    """
+    def write_batch(writer, batch):
+        texts, words, tags, sections = zip(*batch)
+        writer.write_batch(pa.record_batch([pa.array(texts, pa.string()),
+                                            pa.array(words, TOKEN_SCHEMA.field('words').type),
+                                            tags_array(tags),
+                                            pa.array(sections, pa.string())],
+                                           schema=TOKEN_SCHEMA))
+
+    n_rows = 0
+    tmp_fn = fn + ".tmp"
+    with pa.OSFile(tmp_fn, 'wb') as sink, pa.ipc.new_file(sink, TOKEN_SCHEMA) as writer:
+        batch = []
+        for row in rows:
+            text, words, tags = row[:3]
+            if len(words) != len(tags):
+                raise ValueError("Row {}: {} words but {} tags".format(n_rows, len(words), len(tags)))
+            batch.append((text, words, tags, row[3] if len(row) > 3 else None))
+            n_rows += 1
+            if len(batch) >= batch_size:
+                write_batch(writer, batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
+    os.replace(tmp_fn, fn)
+
+    return n_rows
+
+def iter_token_batches(fn, columns=('text', 'words', 'tags', 'section')):
+    # Record batches of the memory-mapped file, nothing is parsed
+    with pa.memory_map(fn) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(list(columns))
+
+def iter_sentences(fn):
+    """
+    Yields the (words, tags) lists of every sentence
+    """
+    for batch in iter_token_batches(fn, ('words', 'tags')):
+        yield from zip(batch.column(0).to_pylist(), batch.column(1).to_pylist())
+
+def read_token_table(fn=TOKEN_CORPUS_FN, columns=None):
+    # The memory-mapped file as a table, the tag ids are the dictionary indices of the tags column
+    table = pa.ipc.open_file(pa.memory_map(fn)).read_all()
+    return table if columns is None else table.select(list(columns))
+
+def read_token_corpus(fn=TOKEN_CORPUS_FN):
+    # The columns of the old all_annotated_regex.csv, with Word and Tag as lists
+    table = read_token_table(fn)
+    return pd.DataFrame({'Text': table.column('text').to_pylist(), 'Word': table.column('words').to_pylist(),
+                         'Tag': table.column('tags').to_pylist(), 'Section': table.column('section').to_pylist()})
+
+def convert_annotated_csv(csv_fn='all_annotated_regex.csv', fn=TOKEN_CORPUS_FN, chunksize=10000):
+    """
+    Converts a csv with list reprs in its Word and Tag columns (the format merge_folder used to write), the
+    reprs are parsed once here
+    """
+    def rows():
+        for chunk in pd.read_csv(csv_fn, chunksize=chunksize):
+            sections = chunk['Section'] if 'Section' in chunk else [None] * len(chunk)
+            for text, words, tags, section in zip(chunk['Text'], chunk['Word'], chunk['Tag'], sections):
+                yield ((text if isinstance(text, str) else None), parse_list(words), parse_list(tags),
+                       (section if isinstance(section, str) else None))
+
+    return write_token_corpus(fn, rows())
+
+def write_docbin(fn, paragraphs, nlp=None):
+    """
+    Stores (text, {'entities': [(start, end, label), ...]}) paragraphs, the spaCy training format, as a
+    DocBin. All entities are kept in doc.spans, overlapping ones as well
+    """
+    if nlp is None:
+        nlp = load_profile('sentences')
+
+    doc_bin = DocBin(attrs=['ORTH', 'ENT_IOB', 'ENT_TYPE'], store_user_data=False)
+    for text, annotations in paragraphs:
+        doc = nlp.make_doc(text)
+        spans = []
+        for start, end, label in annotations.get('entities', []):
+            span = doc.char_span(start, end, label=label, alignment_mode='expand')
+            if span is not None:
+                spans.append(span)
+        doc.spans[SPANS_KEY] = spans
+        doc.ents = filter_spans(spans)
+        doc_bin.add(doc)
+
+    tmp_fn = fn + ".tmp"
+    with open(tmp_fn, 'wb') as f:
+        f.write(doc_bin.to_bytes())
+    os.replace(tmp_fn, fn)
+
+    return len(doc_bin)
+
+def iter_docbin(fn, nlp=None):
+    # Docs of a DocBin, created one by one
+    if nlp is None:
+        nlp = load_profile('sentences')
+
+    return DocBin().from_disk(fn).get_docs(nlp.vocab)
+
+def iter_paragraphs(fn, nlp=None):
+    """
+    Yields the paragraphs of a DocBin in the spaCy training format again
+    """
+    for doc in iter_docbin(fn, nlp):
+        entities = [(span.start_char, span.end_char, span.label_) for span in doc.spans.get(SPANS_KEY, [])]
+        yield doc.text, {'entities': entities}
+
+def convert_annotated_paragraphs(pkl_fn='Annotated_pragraphs.pkl', fn='Annotated_pragraphs.spacy', nlp=None):
+    # Annotated_pragraphs.pkl is a DataFrame with the columns text and annotations
+    df = pd.read_pickle(pkl_fn)
+    return write_docbin(fn, df['annotations'], nlp)
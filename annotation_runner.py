@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from ner_rules import RULES
+from ner_alignment import LABEL_MODE, annotate_file
+from sections import RELEVANT_SECTIONS
+
+# Append-only log of finished documents in the output folder, the last line of every input wins
+MANIFEST_FN = 'manifest.jsonl'
+
+# Outputs written with other rules are annotated again
+RULES_SHA256 = hashlib.sha256(repr(RULES).encode('utf-8')).hexdigest()
+
+def file_sha256(fn):
+    sha = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+def load_manifest(folder):
+    manifest = {}
+    fn = os.path.join(folder, MANIFEST_FN)
+    if os.path.isfile(fn):
+        with open(fn) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash while appending can leave a broken last line
+                    continue
+                manifest[entry['input']] = entry
+
+    return manifest
+
+def is_current(entry, sha256, save_path, mode, sections):
+    return (entry is not None and entry['sha256'] == sha256 and entry.get('rules') == RULES_SHA256
+            and entry.get('mode') == mode and entry.get('sections') == sections and os.path.isfile(save_path))
+
+def annotate_job(path, save_path, mode=LABEL_MODE, sections=None):
+    """
+    Annotates one document, runs in a worker process. Returns the number of lines and tokens, whether its
+    sections were not recognised (so all of it was annotated), or the traceback of the failure
+    """
+    try:
+        df = annotate_file(path, save_path, mode=mode, sections=sections)
+        unstructured = sections is not None and bool(df['Section'].isna().all())
+        return len(df), int(df['Word'].map(len).sum()), unstructured, None
+    except Exception:
+        return 0, 0, False, traceback.format_exc()
+
+def run_annotation(folder_path, save_folder='Annotated', workers=None, mode=LABEL_MODE, sections=None,
+                   force=False):
+    """
+    Annotates every text file of folder_path into save_folder/<name>.csv across a process pool. Documents
+    whose input hash matches the manifest are skipped, so an interrupted run continues where it stopped.
+    With sections (e.g. sections.RELEVANT_SECTIONS) only those parts of the judgments are annotated
+    """
+    sections = list(sections) if sections is not None else None
+    os.makedirs(save_folder, exist_ok=True)
+    manifest = {} if force else load_manifest(save_folder)
+    fns = sorted(next(os.walk(folder_path), (None, None, []))[2])
+
+    jobs = {}
+    skipped = 0
+    for fn in fns:
+        sha256 = file_sha256(os.path.join(folder_path, fn))
+        save_path = os.path.join(save_folder, os.path.splitext(fn)[0] + '.csv')
+        if is_current(manifest.get(fn), sha256, save_path, mode, sections):
+            skipped += 1
+        else:
+            jobs[fn] = (sha256, save_path)
+
+    stats = {'documents': 0, 'skipped': skipped, 'lines': 0, 'tokens': 0, 'failed': [], 'unstructured': []}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(os.path.join(save_folder, MANIFEST_FN), 'a') as manifest_file:
+        futures = {pool.submit(annotate_job, os.path.join(folder_path, fn), save_path, mode, sections): fn
+                   for fn, (sha256, save_path) in jobs.items()}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            fn = futures[future]
+            sha256, save_path = jobs[fn]
+            try:
+                n_lines, n_tokens, unstructured, error = future.result()
+            except Exception:
+                # The worker process died
+                n_lines, n_tokens, unstructured, error = 0, 0, False, traceback.format_exc()
+
+            if error is not None:
+                stats['failed'].append((fn, error))
+                continue
+
+            stats['documents'] += 1
+            if unstructured:
+                stats['unstructured'].append(fn)
+            stats['lines'] += n_lines
+            stats['tokens'] += n_tokens
+            # Only the parent writes the manifest, once the output is in place
+            manifest_file.write(json.dumps({'input': fn, 'sha256': sha256, 'output': os.path.basename(save_path),
+                                            'rules': RULES_SHA256, 'mode': mode, 'sections': sections,
+                                            'lines': n_lines, 'tokens': n_tokens}) + "\n")
+            manifest_file.flush()
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = elapsed
+    report(stats)
+
+    return stats
+
+def report(stats):
+    elapsed = stats['seconds']
+    print("{} documents annotated, {} up to date, {} failed in {:.1f}s ({:.1f} documents/sec, {:.0f} tokens/sec)"
+          .format(stats['documents'], stats['skipped'], len(stats['failed']), elapsed,
+                  stats['documents'] / elapsed if elapsed > 0 else 0.0,
+                  stats['tokens'] / elapsed if elapsed > 0 else 0.0))
+    if stats['unstructured']:
+        print("{} documents without recognised sections were annotated in full: {}".format(
+            len(stats['unstructured']), ", ".join(stats['unstructured'][:20])))
+    for fn, error in stats['failed']:
+        print("--- {}\n{}".format(fn, error))
+
+def parse_sections(args):
+    # --sections selects RELEVANT_SECTIONS, --sections=FACTS,LAW the given ones
+    for arg in args:
+        if arg == '--sections':
+            return RELEVANT_SECTIONS
+        if arg.startswith('--sections='):
+            return arg.split('=', 1)[1].split(',')
+
+    return None
+
+if __name__ == "__main__":
+    folders = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    run_annotation(*(folders[:2] or ['Text', 'Annotated']), sections=parse_sections(sys.argv[1:]))
@@ -0,0 +1,44 @@
+import time
+from tqdm import tqdm
+from nlp_profiles import load_profile
+from dedup import run_deduplicated
+
+def annotate_stream(courts, nlp=None, batch_size=64, n_process=1, stats=None):
+    """
+    Runs the spaCy pipeline once over a stream of paragraphs with nlp.pipe and yields, for every paragraph,
+    its sentences as lists of (token, ent_iob_, ent_type_). Uses the 'ner' profile when no nlp is given
+    """
+    if nlp is None:
+        nlp = load_profile('ner')
+
+    start = time.perf_counter()
+    n_tokens = 0
+    for doc in tqdm(nlp.pipe(courts, batch_size=batch_size, n_process=n_process)):
+        # Sentences and entities come from the same pass, nothing is parsed twice
+        annotated_court = []
+        for sent in doc.sents:
+            annotated_court.append([(token, token.ent_iob_, token.ent_type_) for token in sent])
+        n_tokens += len(doc)
+        yield annotated_court
+
+    # Report throughput
+    elapsed = time.perf_counter() - start
+    tokens_per_sec = n_tokens / elapsed if elapsed > 0 else 0.0
+    if stats is not None:
+        stats.update({'tokens': n_tokens, 'seconds': elapsed, 'tokens_per_sec': tokens_per_sec})
+    print("{} tokens annotated in {:.1f}s ({:.0f} tokens/sec)".format(n_tokens, elapsed, tokens_per_sec))
+
+def annotate_by_sentence2(courts, nlp=None, batch_size=64, n_process=1):
+    # A single paragraph gives a list with one annotated court, as before
+    if isinstance(courts, str):
+        courts = [courts]
+
+    return list(annotate_stream(courts, nlp, batch_size, n_process))
+
+def annotate_deduplicated(courts, nlp=None, batch_size=64, n_process=1, stats=None):
+    """
+    As annotate_by_sentence2, but paragraphs that occur more than once (formulaic text like 'The Court
+    reiterates that ...') are annotated once
+    """
+    return run_deduplicated(courts, lambda texts: list(annotate_stream(texts, nlp, batch_size, n_process)),
+                            stats=stats)
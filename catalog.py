@@ -0,0 +1,144 @@
+import json
+import os
+from datetime import datetime
+from functools import reduce
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Columns selected by the HUDOC query in Scraper.py
+CATALOG_COLUMNS = ['sharepointid', 'Rank', 'ECHRRanking', 'languagenumber', 'itemid', 'docname', 'doctype',
+                   'application', 'appno', 'conclusion', 'importance', 'originatingbody', 'typedescription',
+                   'kpdate', 'kpdateAsText', 'documentcollectionid', 'documentcollectionid2', 'languageisocode',
+                   'extractedappno', 'isplaceholder', 'doctypebranch', 'respondent', 'ecli', 'appnoparts',
+                   'sclappnos', 'echradvopidentifier', 'echradvopstatus']
+
+CATALOG_FN = 'catalog.parquet'
+
+def entries_to_table(entries):
+    # Every column is kept as a string, missing columns become nulls
+    data = {col: [] for col in CATALOG_COLUMNS}
+    for entry in entries:
+        for col in CATALOG_COLUMNS:
+            value = entry.get(col)
+            data[col].append(None if value in (None, '') else str(value))
+    table = pa.table({col: pa.array(values, pa.string()) for col, values in data.items()})
+
+    # Typed columns for the predicates
+    kpdate = pc.strptime(pc.utf8_slice_codeunits(table['kpdate'], 0, 19), format='%Y-%m-%dT%H:%M:%S', unit='s',
+                         error_is_null=True)
+    table = table.set_column(table.schema.get_field_index('kpdate'), 'kpdate', kpdate)
+    importance = pc.cast(table['importance'], pa.int8())
+    table = table.set_column(table.schema.get_field_index('importance'), 'importance', importance)
+
+    # Low cardinality columns are dictionary encoded
+    for col in ['doctype', 'respondent', 'originatingbody', 'documentcollectionid', 'languageisocode']:
+        table = table.set_column(table.schema.get_field_index(col), col, pc.dictionary_encode(table[col]))
+
+    return table
+
+def read_checkpoint_entries(checkpoint_dir):
+    # Load the columns of every page saved by Scraper.iter_entries
+    entries = []
+    for fn in sorted(os.listdir(checkpoint_dir)):
+        if fn.startswith("page_") and fn.endswith(".json"):
+            with open(os.path.join(checkpoint_dir, fn)) as f:
+                entries.extend(json.load(f))
+
+    return entries
+
+def build_catalog(entries, fn=CATALOG_FN, row_group_size=2048):
+    """
+    Writes the metadata of all entries to a Parquet catalog, merging with an existing catalog on itemid
+    """
+    table = entries_to_table(entries)
+
+    # Newly scraped entries replace older rows with the same itemid
+    if os.path.isfile(fn):
+        old = pq.read_table(fn)
+        old = old.filter(pc.invert(pc.is_in(old['itemid'], value_set=table['itemid'])))
+        table = pa.concat_tables([old.cast(table.schema), table], promote_options='permissive')
+
+    # Sorting on kpdate makes the row group min/max statistics act as a date index
+    table = table.sort_by([('kpdate', 'ascending'), ('itemid', 'ascending')])
+    tmp_fn = fn + ".tmp"
+    pq.write_table(table, tmp_fn, row_group_size=row_group_size, write_statistics=True)
+    os.replace(tmp_fn, fn)
+
+    return table.num_rows
+
+def load_catalog(fn=CATALOG_FN, columns=None, importance=None, since=None, until=None, respondent=None,
+                 doctype=None):
+    """
+    Loads the catalog rows matching all given predicates
+
+    importance: maximum importance level (1 = key case), since/until: kpdate range as 'YYYY-MM-DD',
+    respondent: state code or list of codes (e.g. 'TUR'), doctype: doctype or list of doctypes
+    """
+    # Predicates on typed columns are pushed down to the row group statistics
+    filters = []
+    if importance is not None:
+        filters.append(('importance', '<=', importance))
+    if since is not None:
+        filters.append(('kpdate', '>=', pa.scalar(since, pa.string()).cast(pa.timestamp('s'))))
+    if until is not None:
+        filters.append(('kpdate', '<=', pa.scalar(until, pa.string()).cast(pa.timestamp('s'))))
+    if doctype is not None:
+        filters.append(('doctype', 'in', [doctype] if isinstance(doctype, str) else list(doctype)))
+    table = pq.read_table(fn, filters=filters or None)
+
+    # Cases can have several respondents, separated by ';'
+    if respondent is not None:
+        states = [respondent] if isinstance(respondent, str) else list(respondent)
+        respondents = pc.cast(table['respondent'], pa.string())
+        mask = reduce(pc.or_, [pc.match_substring(respondents, state) for state in states])
+        table = table.filter(pc.fill_null(mask, False))
+
+    if columns is not None:
+        table = table.select(columns)
+
+    return table
+
+def parse_kpdate(value):
+    # kpdate as the catalog stores it, None when it is missing or malformed
+    try:
+        return datetime.strptime(str(value)[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+def entry_matches(entry, importance=None, since=None, until=None, respondent=None, doctype=None):
+    """
+    Whether the columns of a single query entry match the predicates of load_catalog, for entries that are
+    streamed in before they are written to the catalog
+    """
+    if importance is not None:
+        try:
+            if int(entry.get('importance')) > importance:
+                return False
+        except (TypeError, ValueError):
+            return False
+    if since is not None or until is not None:
+        kpdate = parse_kpdate(entry.get('kpdate'))
+        if kpdate is None:
+            return False
+        if since is not None and kpdate < datetime.fromisoformat(since):
+            return False
+        if until is not None and kpdate > datetime.fromisoformat(until):
+            return False
+    if doctype is not None and entry.get('doctype') not in ([doctype] if isinstance(doctype, str) else doctype):
+        return False
+    if respondent is not None:
+        states = [respondent] if isinstance(respondent, str) else list(respondent)
+        if not any(state in (entry.get('respondent') or '') for state in states):
+            return False
+
+    return True
+
+def select_ids(fn=CATALOG_FN, **where):
+    # Item ids of all cases matching the predicates
+    return load_catalog(fn, columns=['itemid'], **where)['itemid'].to_pylist()
+
+def select_files(folder_path, fn=CATALOG_FN, extension=".docx", **where):
+    # File names in folder_path of all cases matching the predicates
+    return [entry_id + extension for entry_id in select_ids(fn, **where)
+            if os.path.isfile(os.path.join(folder_path, entry_id + extension))]
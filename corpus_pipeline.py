@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+from Scraper import DOCX_URL, download_all
+from hudoc_text import clean_text, get_text
+
+# Folder with the text shards of the corpus
+SHARD_DIR = 'Shards'
+
+def convert_docx(entry_id, fn):
+    """
+    Converts one downloaded file to cleaned text, runs in a worker process
+    """
+    try:
+        return entry_id, clean_text(get_text(os.path.basename(fn), os.path.dirname(fn))), None
+    except Exception as e:
+        return entry_id, None, "{}: {}".format(type(e).__name__, e)
+
+class ShardWriter:
+    """
+    Appends (itemid, text) records to size-capped JSONL or Parquet shards. A shard is only renamed to its
+    final name once it is complete, so readers never see a shard that is still being written
+    """
+    def __init__(self, shard_dir=SHARD_DIR, max_bytes=64 * 1024 * 1024, format='jsonl'):
+        if format not in ('jsonl', 'parquet'):
+            raise ValueError("Unknown shard format: {}".format(format))
+        Path(shard_dir).mkdir(parents=True, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.max_bytes = max_bytes
+        self.format = format
+        self.shard_index = len(shard_files(shard_dir))
+        self.records = 0
+        self.size = 0
+        self.file = None
+        self.buffer = []
+
+    def shard_fn(self):
+        return os.path.join(self.shard_dir, "shard_{:05d}.{}".format(self.shard_index, self.format))
+
+    def write(self, entry_id, text):
+        if self.format == 'jsonl':
+            if self.file is None:
+                self.file = open(self.shard_fn() + ".part", 'w', encoding='utf-8')
+            line = json.dumps({'itemid': entry_id, 'text': text}, ensure_ascii=False) + "\n"
+            self.file.write(line)
+            self.size += len(line.encode('utf-8'))
+        else:
+            self.buffer.append((entry_id, text))
+            self.size += len(text.encode('utf-8'))
+        self.records += 1
+
+        if self.size >= self.max_bytes:
+            self.roll()
+
+    def roll(self):
+        # Finish the current shard and start a new one
+        if self.records == 0:
+            return
+        if self.format == 'jsonl':
+            self.file.close()
+            self.file = None
+            os.replace(self.shard_fn() + ".part", self.shard_fn())
+        else:
+            table = pa.table({'itemid': pa.array([entry_id for entry_id, _ in self.buffer], pa.string()),
+                              'text': pa.array([text for _, text in self.buffer], pa.large_string())})
+            pq.write_table(table, self.shard_fn() + ".part", compression='zstd')
+            os.replace(self.shard_fn() + ".part", self.shard_fn())
+            self.buffer = []
+        self.shard_index += 1
+        self.records = 0
+        self.size = 0
+
+    def close(self):
+        self.roll()
+
+def shard_files(shard_dir=SHARD_DIR):
+    # Only complete shards, in the order they were written
+    if not os.path.isdir(shard_dir):
+        return []
+
+    return [os.path.join(shard_dir, fn) for fn in sorted(os.listdir(shard_dir))
+            if fn.startswith("shard_") and fn.endswith((".jsonl", ".parquet"))]
+
+def read_shard(fn):
+    # Yields (itemid, text) from a single shard
+    if fn.endswith(".parquet"):
+        table = pq.read_table(fn)
+        yield from zip(table['itemid'].to_pylist(), table['text'].to_pylist())
+    else:
+        with open(fn, encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                yield record['itemid'], record['text']
+
+def iter_shards(shard_dir=SHARD_DIR):
+    # A document that was downloaded again appears again in a later shard
+    for fn in shard_files(shard_dir):
+        yield from read_shard(fn)
+
+def read_shard_ids(shard_dir=SHARD_DIR):
+    ids = set()
+    for fn in shard_files(shard_dir):
+        if fn.endswith(".parquet"):
+            ids.update(pq.read_table(fn, columns=['itemid'])['itemid'].to_pylist())
+        else:
+            ids.update(entry_id for entry_id, _ in read_shard(fn))
+
+    return ids
+
+async def download_to_shards(ids_lst, folder='Files', shard_dir=SHARD_DIR, workers=None, max_bytes=64 * 1024 * 1024,
+                             format='jsonl', max_pending=None, **kwargs):
+    """
+    Downloads all ids and converts every file to cleaned text in a process pool as soon as it is on disk.
+    Files that are already in a shard are only converted again when they were downloaded again. At most
+    max_pending conversions (twice the pool size by default) are in flight, downloads wait for a free slot
+    """
+    stats = {'converted': 0, 'failed': {}}
+    done = read_shard_ids(shard_dir)
+    writer = ShardWriter(shard_dir, max_bytes, format)
+    loop = asyncio.get_running_loop()
+    if max_pending is None:
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+    slots = asyncio.Semaphore(max_pending)
+    # Only the conversions in flight are kept, a finished one is dropped with its text
+    pending = set()
+
+    def on_converted(future):
+        pending.discard(future)
+        slots.release()
+        entry_id, text, error = future.result()
+        if error is not None:
+            stats['failed'][entry_id] = error
+        else:
+            writer.write(entry_id, text)
+            stats['converted'] += 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        async def on_file(entry_id, fn, result):
+            if entry_id in done and result != 'downloaded':
+                return
+            await slots.acquire()
+            future = loop.run_in_executor(pool, convert_docx, entry_id, fn)
+            pending.add(future)
+            future.add_done_callback(on_converted)
+
+        stats['download'] = await download_all(ids_lst, folder, on_file=on_file, **kwargs)
+        await asyncio.gather(*list(pending))
+
+    writer.close()
+
+    return stats
+
+def scrape_to_shards(ids_lst, folder='Files', shard_dir=SHARD_DIR, workers=None, max_bytes=64 * 1024 * 1024,
+                     format='jsonl', docx_url=DOCX_URL, **kwargs):
+    Path(folder).mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    stats = asyncio.run(download_to_shards(ids_lst, folder, shard_dir, workers, max_bytes, format,
+                                           docx_url=docx_url, **kwargs))
+    elapsed = time.perf_counter() - start
+
+    print("{} documents converted to text, {} not extracted in {:.1f}s ({:.2f} docs/sec)".format(
+        stats['converted'], len(stats['failed']), elapsed, stats['converted'] / elapsed if elapsed > 0 else 0.0))
+
+    return stats
@@ -0,0 +1,129 @@
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from hudoc_text import load_hudoc
+
+# File layout: header | text blobs | index (blob offsets, blob lengths, id offsets, id bytes), sorted by itemid
+MAGIC = b'HUDOCCS1'
+HEADER = struct.Struct('<8sIIQQ')
+COMPRESSIONS = {None: 0, 'zlib': 1}
+
+def write_corpus_store(fn, items, compression='zlib', level=6):
+    """
+    Writes (itemid, text) tuples to a single corpus file, later duplicates of an itemid replace earlier ones
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression: {}".format(compression))
+
+    index = {}
+    tmp_fn = fn + ".tmp"
+    with open(tmp_fn, 'wb') as f:
+        # The header is written again at the end, when the index offset is known
+        f.write(HEADER.pack(MAGIC, 1, COMPRESSIONS[compression], 0, 0))
+        for entry_id, text in items:
+            blob = text.encode('utf-8')
+            if compression == 'zlib':
+                blob = zlib.compress(blob, level)
+            index[entry_id] = (f.tell(), len(blob))
+            f.write(blob)
+
+        # Align the index to 8 bytes
+        f.write(b'\0' * (-f.tell() % 8))
+        index_offset = f.tell()
+        ids = sorted(index)
+        id_bytes = [entry_id.encode('utf-8') for entry_id in ids]
+        id_offsets = [0]
+        for b in id_bytes:
+            id_offsets.append(id_offsets[-1] + len(b))
+        f.write(struct.pack('<{}Q'.format(len(ids)), *(index[entry_id][0] for entry_id in ids)))
+        f.write(struct.pack('<{}Q'.format(len(ids)), *(index[entry_id][1] for entry_id in ids)))
+        f.write(struct.pack('<{}Q'.format(len(ids) + 1), *id_offsets))
+        f.write(b''.join(id_bytes))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, 1, COMPRESSIONS[compression], len(ids), index_offset))
+    os.replace(tmp_fn, fn)
+
+    return len(ids)
+
+def build_corpus_store(fn, folder_path, compression='zlib', **kwargs):
+    # Fill a corpus file with the get_text output of every docx file in folder_path
+    def items():
+        for batch in load_hudoc(folder_path, **kwargs):
+            yield from batch
+
+    return write_corpus_store(fn, items(), compression)
+
+class CorpusStore:
+    """
+    Read-only, memory-mapped access to a corpus file. Lookups by itemid are O(1), get_raw returns a
+    zero-copy view on the stored blob (release it before closing the store). Pickling only keeps the path,
+    so every worker process maps the file itself
+    """
+    def __init__(self, fn):
+        self.fn = fn
+        self.open()
+
+    def open(self):
+        with open(self.fn, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, compression, n_docs, index_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a corpus file".format(self.fn))
+        self.compressed = compression == COMPRESSIONS['zlib']
+
+        # Only the index is read into memory, the texts stay in the mapped file
+        end = index_offset + 8 * n_docs
+        self.offsets = array('Q', self.mm[index_offset:end])
+        self.lengths = array('Q', self.mm[end:end + 8 * n_docs])
+        id_offsets = array('Q', self.mm[end + 8 * n_docs:end + 16 * n_docs + 8])
+        id_bytes = self.mm[end + 16 * n_docs + 8:end + 16 * n_docs + 8 + id_offsets[-1]]
+        self.ids = [id_bytes[id_offsets[i]:id_offsets[i + 1]].decode('utf-8') for i in range(n_docs)]
+        self.positions = {entry_id: i for i, entry_id in enumerate(self.ids)}
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        return {'fn': self.fn}
+
+    def __setstate__(self, state):
+        self.fn = state['fn']
+        self.open()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entry_id):
+        return entry_id in self.positions
+
+    def get_raw(self, entry_id):
+        # Stored (possibly compressed) bytes, without copying
+        i = self.positions[entry_id]
+        return memoryview(self.mm)[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+
+    def __getitem__(self, entry_id):
+        raw = self.get_raw(entry_id)
+        return str(zlib.decompress(raw) if self.compressed else raw, 'utf-8')
+
+    def get(self, entry_id, default=None):
+        return self[entry_id] if entry_id in self.positions else default
+
+    def iter_range(self, start_id=None, end_id=None):
+        # Yields (itemid, text) for start_id <= itemid <= end_id, in itemid order
+        lo = 0 if start_id is None else bisect_left(self.ids, start_id)
+        hi = len(self.ids) if end_id is None else bisect_right(self.ids, end_id)
+        for entry_id in self.ids[lo:hi]:
+            yield entry_id, self[entry_id]
+
+    def __iter__(self):
+        return self.iter_range()
@@ -0,0 +1,190 @@
+import re
+import time
+import zlib
+import numpy as np
+
+TOKEN_RE = re.compile(r'\w+')
+# Paragraph numbers, dates and application numbers differ between otherwise identical boilerplate
+DIGITS_RE = re.compile(r'\d+')
+
+# Bits kept of every 64 bit hash value
+HASH_BITS = 32
+
+def shingles(text, ngram=3):
+    """
+    Hashes of the word n-grams of a normalized text, numbers are replaced by 0
+    """
+    words = TOKEN_RE.findall(DIGITS_RE.sub('0', text.lower()))
+    if len(words) < ngram:
+        words = [" ".join(words)]
+    else:
+        words = [" ".join(words[i:i + ngram]) for i in range(len(words) - ngram + 1)]
+
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in set(words)), dtype=np.uint64)
+
+def lsh_params(num_perm, threshold):
+    # Bands and rows (bands * rows <= num_perm) whose S-curve (1 / bands) ** (1 / rows) is closest to threshold
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+
+    return best[1], best[2]
+
+class NearDuplicateIndex:
+    """
+    Clusters texts whose estimated Jaccard similarity of word shingles is at least threshold. Every text is
+    compared only with the cluster representatives that share an LSH bucket with it; the first text of a
+    cluster is its representative
+    """
+    def __init__(self, threshold=0.8, num_perm=128, ngram=3, seed=1):
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+        self.num_perm = self.bands * self.rows
+
+        # Multiply-shift hash functions, a has to be odd
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(0, 2 ** 32, size=self.num_perm, dtype=np.uint64) << np.uint64(32) \
+            | rng.randint(0, 2 ** 32, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.randint(0, 2 ** 32, size=self.num_perm, dtype=np.uint64)
+
+        self.buckets = [{} for _ in range(self.bands)]
+        self.exact = {}
+        self.signatures = []
+        self.representatives = []
+        self.assignment = []
+
+    def signature(self, text):
+        hashes = shingles(text, self.ngram)
+        if len(hashes) == 0:
+            return np.zeros(self.num_perm, dtype=np.uint64)
+        # The uint64 products wrap around, which is what multiply-shift hashing needs
+        with np.errstate(over='ignore'):
+            values = (hashes[:, None] * self.a[None, :] + self.b[None, :]) >> np.uint64(64 - HASH_BITS)
+
+        return values.min(axis=0)
+
+    def add(self, text):
+        """
+        Adds a text and returns the position of its representative among the representatives
+        """
+        key = " ".join(TOKEN_RE.findall(DIGITS_RE.sub('0', text.lower())))
+        if key in self.exact:
+            cluster = self.exact[key]
+            self.assignment.append(cluster)
+            return cluster
+
+        signature = self.signature(text)
+        band_keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+        cluster = None
+        checked = set()
+        for band, band_key in zip(self.buckets, band_keys):
+            candidate = band.get(band_key)
+            if candidate is None or candidate in checked:
+                continue
+            checked.add(candidate)
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                cluster = candidate
+                break
+
+        if cluster is None:
+            # A new representative
+            cluster = len(self.representatives)
+            self.representatives.append(len(self.assignment))
+            self.signatures.append(signature)
+            for band, band_key in zip(self.buckets, band_keys):
+                band.setdefault(band_key, cluster)
+
+        self.exact[key] = cluster
+        self.assignment.append(cluster)
+
+        return cluster
+
+def deduplicate(texts, threshold=0.8, num_perm=128, ngram=3):
+    """
+    Returns the indices of the representative texts and, for every text, the position of its representative
+    in that list
+    """
+    index = NearDuplicateIndex(threshold, num_perm, ngram)
+    for text in texts:
+        index.add(text)
+
+    return index.representatives, np.array(index.assignment, dtype=np.int64)
+
+def unique_texts(texts):
+    """
+    Returns the indices of the distinct texts and, for every text, the position of its identical text in that
+    list. Only byte-identical texts share a result, near-duplicates differ in their numbers or words
+    """
+    positions = {}
+    unique = []
+    assignment = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        position = positions.get(text)
+        if position is None:
+            position = positions[text] = len(unique)
+            unique.append(i)
+        assignment[i] = position
+
+    return unique, assignment
+
+def fan_out(results, assignment):
+    # The result of every distinct text for all its identical copies
+    return [results[position] for position in assignment]
+
+def run_deduplicated(texts, process, stats=None):
+    """
+    Calls process (a function from a list of texts to a list of results) once per distinct text and returns a
+    result for every text; only byte-identical texts share a result. Prints the share of the texts and
+    characters that were not processed
+    """
+    texts = list(texts)
+    start = time.perf_counter()
+    unique, assignment = unique_texts(texts)
+    dedup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = list(process([texts[i] for i in unique]))
+    process_seconds = time.perf_counter() - start
+
+    total_chars = sum(len(text) for text in texts)
+    processed_chars = sum(len(texts[i]) for i in unique)
+    ratio = 1 - len(unique) / len(texts) if texts else 0.0
+    saved = 1 - processed_chars / total_chars if total_chars else 0.0
+    # Processing time of the skipped texts, assuming it grows with their length
+    saved_seconds = process_seconds * (total_chars - processed_chars) / processed_chars if processed_chars else 0.0
+
+    if stats is not None:
+        stats.update({'texts': len(texts), 'unique': len(unique), 'duplicate_ratio': ratio, 'saved_chars': saved,
+                      'dedup_seconds': dedup_seconds, 'process_seconds': process_seconds,
+                      'saved_seconds': saved_seconds})
+    print("{} texts, {} distinct, exact duplicate ratio {:.1%}, {:.1%} of the characters skipped "
+          "(~{:.1f}s saved, dedup took {:.1f}s)".format(len(texts), len(unique), ratio, saved, saved_seconds,
+                                                        dedup_seconds))
+
+    return fan_out(results, assignment)
+
+def near_duplicate_report(texts, threshold=0.8, num_perm=128, ngram=3, top=10):
+    """
+    Clusters near-duplicate texts and prints the largest clusters, to see how much of a corpus is formulaic.
+    Not part of the annotation path: near-duplicates differ in the words that get annotated. Returns the
+    position of the representative of every text
+    """
+    texts = list(texts)
+    start = time.perf_counter()
+    representatives, assignment = deduplicate(texts, threshold, num_perm, ngram)
+    elapsed = time.perf_counter() - start
+
+    sizes = np.bincount(assignment, minlength=len(representatives))
+    print("{} texts in {} near-duplicate clusters (threshold {}) in {:.1f}s".format(
+        len(texts), len(representatives), threshold, elapsed))
+    for cluster in np.argsort(-sizes, kind='stable')[:top]:
+        if sizes[cluster] < 2:
+            break
+        print("  {:>6} x {!r}".format(sizes[cluster], texts[representatives[cluster]][:80]))
+
+    return assignment
@@ -1,17 +1,13 @@
-import spacy
-from spacy.lang.en import English
 import networkx as nx
 import matplotlib.pyplot as plt
 import os
+from nlp_profiles import load_profile
+from sentence_splitter import split_sentences
 os.environ["KMP_DUPLICATE_LIB_OK"]="TRUE"
 
 def getSentences(text):
-    nlp = English()
-    #nlp.add_pipe(nlp.create_pipe('sentencizer'))
-    nlp.add_pipe('sentencizer')
-    document = nlp(text)
-    #print([type(sent.text) for sent in document.sents])
-    return [sent.text.strip() for sent in document.sents]
+    # Rule-based splitting, no spaCy pipeline needed
+    return split_sentences(text)
 
 def printToken(token):
     print(token.text, "->", token.dep_)
@@ -57,7 +53,8 @@ def processSubjectObjectPairs(tokens):
     return (subject.strip(), relation.strip(), object.strip())
 
 def processSentence(sentence):
-    tokens = nlp_model(sentence)
+    # Parser and lemmas, without the NER component
+    tokens = load_profile('dependencies')(sentence)
     return processSubjectObjectPairs(tokens)
 
 def printGraph(triples):
@@ -95,7 +92,6 @@ if __name__ == "__main__":
     # text = "On 11 February 2014 the Broadcasting Council issued a new decision in which it again concluded that the applicant company had breached the Broadcasting and Retransmission Act and fined it EUR 500. It held that the applicant company’s freedom of expression was to be restricted on the grounds of the ban on promoting drug use provided for in section 19(1)e) of the Broadcasting and Retransmission Act, which pursued the legitimate aim of protecting public order. That ban reflected the public interest in not publishing information which amounted to a positive assessment of drug use. Given the objective (strict) liability nature of the administrative offence, what was decisive in the case at hand was not whether the applicant company had aimed to promote drug use, but whether the programme, in the light of its content and the manner of processing the information, had had a promotional character. In the Broadcasting Council’s opinion, such was the case since X.’s comments had disseminated the idea that marijuana had a positive influence; the journalist’s comments had downplayed and justified them as being common, which went beyond a simple statement of views and beyond reproducing information that had already been publicly available. In that way, the applicant company had significantly interfered with the legitimate interests in protecting public order, health and morals, while the lowest possible fine had restricted its freedom of expression to a very little extent, which had made the interference fully proportionate."
 
     sentences = getSentences(text)
-    nlp_model = spacy.load('en_core_web_sm')
 
     triples = []
     print (text)
@@ -0,0 +1,215 @@
+import os
+import random
+import tempfile
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import walk
+from tqdm import tqdm
+from catalog import select_files
+
+# WordprocessingML tags, as produced by ElementTree
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+BODY = W_NS + 'body'
+P = W_NS + 'p'
+R = W_NS + 'r'
+T = W_NS + 't'
+BR = W_NS + 'br'
+HYPERLINK = W_NS + 'hyperlink'
+BR_TYPE = W_NS + 'type'
+
+# Run content that is not a w:t element, with its text equivalent
+RUN_TEXT = {W_NS + 'tab': '\t', W_NS + 'cr': '\n', W_NS + 'noBreakHyphen': '-', W_NS + 'ptab': '\t'}
+
+def iter_paragraphs(path):
+    """
+    Streams the text of all body paragraphs from word/document.xml, without building a document model.
+    Gives the same text as python-docx doc.paragraphs: runs directly in a body paragraph or in one of its
+    hyperlinks count, tables and other nested content do not
+    """
+    with zipfile.ZipFile(path) as zf, zf.open('word/document.xml') as xml:
+        stack = []
+        parts = []
+        body = None
+        for event, elem in ET.iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem.tag)
+                if elem.tag == BODY and len(stack) == 2:
+                    body = elem
+                continue
+
+            tag = stack.pop()
+            depth = len(stack)
+
+            # Content of a run in a body paragraph (document/body/p/r or document/body/p/hyperlink/r)
+            if depth >= 4 and stack[-1] == R and stack[1] == BODY and stack[2] == P and \
+                    (depth == 4 or (depth == 5 and stack[3] == HYPERLINK)):
+                if tag == T:
+                    parts.append(elem.text or '')
+                elif tag == BR:
+                    # Page and column breaks have no text equivalent
+                    if elem.get(BR_TYPE, 'textWrapping') == 'textWrapping':
+                        parts.append('\n')
+                elif tag in RUN_TEXT:
+                    parts.append(RUN_TEXT[tag])
+
+            # End of a body level element
+            elif depth == 2 and body is not None:
+                if tag == P:
+                    yield ''.join(parts)
+                parts = []
+
+                # Drop the finished element, so memory stays flat for long judgments
+                body.remove(elem)
+
+def get_text(fn, folder_path):
+    return '\n'.join(iter_paragraphs(os.path.join(folder_path, fn)))
+
+def get_text_docx(fn, folder_path):
+    # Reference implementation on top of python-docx, only used to check and benchmark get_text
+    from docx import Document
+
+    with open(os.path.join(folder_path, fn), "rb") as fref:
+        doc = Document(fref)
+    text = []
+    for para in doc.paragraphs:
+        text.append(para.text)
+
+    return '\n'.join(text)
+
+def clean_text(text):
+    return text.replace('\xa0', ' ')
+
+def clean_file(courts):
+    return [clean_text(court) for court in courts]
+
+def extract_batch(fns, folder_path, clean=True):
+    """
+    Extracts the text of a batch of files, runs in a worker process
+    """
+    texts = []
+    failures = []
+    for fn in fns:
+        try:
+            text = get_text(fn, folder_path)
+            texts.append((os.path.splitext(fn)[0], clean_text(text) if clean else text))
+        except Exception as e:
+            failures.append((fn, "{}: {}".format(type(e).__name__, e)))
+
+    return texts, failures
+
+class HudocLoader:
+    """
+    Lazily extracts the texts of all docx files in folder_path with a process pool. Iterating yields lists
+    of at most batch_size (itemid, text) tuples, with at most max_pending batches in memory at any time.
+    Files that could not be extracted are listed in failures as (file name, exception)
+    """
+    def __init__(self, folder_path, batch_size=64, workers=None, max_pending=None, clean=True, fns=None,
+                 where=None):
+        self.folder_path = folder_path
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 2 * self.workers
+        self.clean = clean
+        self.failures = []
+
+        # Only the documents matching the catalog predicates (e.g. where={'importance': 1})
+        if fns is None and where is not None:
+            fns = select_files(folder_path, **where)
+        if fns is None:
+            fns = sorted(fn for fn in next(walk(folder_path), (None, None, []))[2] if fn.endswith(".docx"))
+        self.fns = fns
+
+    def __len__(self):
+        return len(self.fns)
+
+    def __iter__(self):
+        self.failures = []
+        batches = (self.fns[i:i + self.batch_size] for i in range(0, len(self.fns), self.batch_size))
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool, tqdm(total=len(self.fns)) as progress:
+            # Keep a bounded number of batches in flight, yielded in file order
+            for batch in batches:
+                pending.append(pool.submit(extract_batch, batch, self.folder_path, self.clean))
+                if len(pending) >= self.max_pending:
+                    yield self.collect(pending.popleft(), progress)
+            while pending:
+                yield self.collect(pending.popleft(), progress)
+
+        self.report()
+
+    def collect(self, future, progress):
+        texts, failures = future.result()
+        self.failures.extend(failures)
+        progress.update(len(texts) + len(failures))
+        return texts
+
+    def report(self):
+        print("{} files not extracted.".format(len(self.failures)))
+        for fn, error in self.failures:
+            print("  {}: {}".format(fn, error))
+
+def load_hudoc(folder_path, **kwargs):
+    return HudocLoader(folder_path, **kwargs)
+
+def generate_test_docs(folder_path, n_docs=20, n_paragraphs=2000, seed=12345):
+    """
+    Writes judgment-like docx files with tabs, line breaks, tables and non-breaking spaces
+    """
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    rng = random.Random(seed)
+    words = ["the", "applicant", "Court", "Article", "§", "no. 11882/10", "v.", "Government", "judgment",
+             "16\xa0March\xa02006", "complained", "that", "Convention", "domestic", "proceedings"]
+    fns = []
+    for i in range(n_docs):
+        doc = Document()
+        for j in range(n_paragraphs):
+            para = doc.add_paragraph("{}. ".format(j + 1))
+            for _ in range(rng.randint(1, 4)):
+                run = para.add_run(" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))))
+                if rng.random() < 0.1:
+                    run.add_tab()
+                if rng.random() < 0.05:
+                    run.add_break()
+                if rng.random() < 0.01:
+                    run.add_break(WD_BREAK.PAGE)
+            if j % 200 == 0:
+                doc.add_table(rows=2, cols=2).cell(0, 0).text = "Table text is not a body paragraph"
+        fn = "001-{}.docx".format(i)
+        doc.save(os.path.join(folder_path, fn))
+        fns.append(fn)
+
+    return fns
+
+def benchmark_get_text(folder_path=None, n_docs=20, n_paragraphs=2000):
+    """
+    Compares get_text with the python-docx implementation on generated (or existing) docx files
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if folder_path is None:
+            folder_path = tmp_dir
+            fns = generate_test_docs(folder_path, n_docs, n_paragraphs)
+        else:
+            fns = [fn for fn in sorted(os.listdir(folder_path)) if fn.endswith(".docx")][:n_docs]
+        size = sum(os.path.getsize(os.path.join(folder_path, fn)) for fn in fns)
+
+        results = {}
+        for name, extract in [("python-docx", get_text_docx), ("streaming", get_text)]:
+            start = time.perf_counter()
+            results[name] = [extract(fn, folder_path) for fn in fns]
+            elapsed = time.perf_counter() - start
+            print("{:<12} {:.3f}s ({:.1f} docs/sec, {:.1f} MB/s)".format(
+                name, elapsed, len(fns) / elapsed, size / elapsed / 1e6))
+
+    mismatches = sum(a != b for a, b in zip(results["python-docx"], results["streaming"]))
+    print("{} of {} documents differ".format(mismatches, len(fns)))
+
+    return mismatches
+
+if __name__ == "__main__":
+    benchmark_get_text()
@@ -0,0 +1,132 @@
+import os
+import numpy as np
+import pandas as pd
+from nlp_profiles import load_profile
+from ner_rules import base_labels, build_NE_Lst
+from sections import select_paragraphs, structure
+
+LABEL_MODE = 'BIO'
+LABEL_PREFIXES = {'BIO': ['B-', 'I-'], 'BILOU': ['B-', 'I-', 'L-', 'U-']}
+
+# Columns of the annotated files of MRP1_Hudoc_NER_annotation.ipynb
+DF_COLUMNS = ['Text', 'Word', 'POS', 'Tag', 'Word_idx', 'Tag_idx']
+
+def create_labels(labels=base_labels, mode=LABEL_MODE):
+    """
+    Tag names and ids, 0 is 'O' and every base label gets one id per prefix, as create_lables of the notebook
+    """
+    label_list = ['O']
+    for label in labels:
+        label_list.extend(prefix + label for prefix in LABEL_PREFIXES[mode])
+
+    return label_list, list(range(len(label_list)))
+
+def get_ne_label(base=1, mod=0, mode=LABEL_MODE):
+    # Tag id of a prefix (0 = B, 1 = I, 2 = L, 3 = U) of the base label with tag id base
+    return (base - 1) * len(LABEL_PREFIXES[mode]) + 1 + mod
+
+def get_file(path):
+    with open(path, encoding='utf-8') as file:
+        return [line.rstrip() for line in file]
+
+def get_text(lines):
+    return "".join(ln + "\n" for ln in lines)
+
+def tokenize_lines(lines, nlp=None):
+    """
+    Tokenizes every line and returns the words per line and the start and end offsets of all tokens in the
+    document text of get_text(lines)
+    """
+    if nlp is None:
+        nlp = load_profile('sentences')
+
+    words = []
+    starts = []
+    ends = []
+    line_start = 0
+    for ln, doc in zip(lines, nlp.tokenizer.pipe(lines)):
+        words.append([token.text for token in doc])
+        starts.extend(line_start + token.idx for token in doc)
+        ends.extend(line_start + token.idx + len(token) for token in doc)
+        line_start += len(ln) + 1
+
+    return words, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+def align_spans(starts, ends, spans, mode=LABEL_MODE):
+    """
+    Tag ids of all tokens for the non-overlapping entity spans. A token is part of a span when their
+    characters overlap
+    """
+    tags = np.zeros(len(starts), dtype=np.int64)
+    if not spans:
+        return tags
+
+    span_starts = np.fromiter((span.start for span in spans), dtype=np.int64, count=len(spans))
+    span_ends = np.fromiter((span.end for span in spans), dtype=np.int64, count=len(spans))
+    b_tags = get_ne_label(np.fromiter((span.tag_id for span in spans), dtype=np.int64, count=len(spans)),
+                          0, mode)
+
+    # First token ending after the span start, last token starting before the span end
+    first = np.searchsorted(ends, span_starts, side='right')
+    last = np.searchsorted(starts, span_ends, side='left') - 1
+    keep = last >= first
+    first, last, b_tags = first[keep], last[keep], b_tags[keep]
+
+    # Inside tags for all tokens of all spans at once
+    lengths = last - first + 1
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(first, lengths)
+    tags[positions] = np.repeat(b_tags + 1, lengths)
+    tags[first] = b_tags
+    if mode == 'BILOU':
+        tags[last[lengths > 1]] = b_tags[lengths > 1] + 2
+        tags[first[lengths == 1]] = b_tags[lengths == 1] + 3
+
+    return tags
+
+def build_df(lines, spans=(), nlp=None, mode=LABEL_MODE):
+    """
+    One row per line with its words and tags, the spans are character offsets in get_text(lines). The
+    columns are built first and the DataFrame once
+    """
+    label_list, _ = create_labels(base_labels, mode)
+    words, starts, ends = tokenize_lines(lines, nlp)
+    tags = align_spans(starts, ends, list(spans), mode)
+
+    tag_ids = np.split(tags, np.cumsum([len(w) for w in words])[:-1]) if words else []
+    tag_ids = [line_tags.tolist() for line_tags in tag_ids]
+
+    return pd.DataFrame({
+        'Text': lines,
+        'Word': words,
+        'POS': [None] * len(lines),
+        'Tag': [[label_list[tag] for tag in line_tags] for line_tags in tag_ids],
+        'Word_idx': [None] * len(lines),
+        'Tag_idx': tag_ids,
+    }, columns=DF_COLUMNS)
+
+def annotate_lines(lines, nlp=None, mode=LABEL_MODE, sections=None):
+    """
+    The regex entities of a document, aligned to its tokens. With sections, only the lines of those
+    sections are annotated and every row gets its section; the judges and registrars are still taken
+    from the composition of the Court
+    """
+    if sections is None:
+        return build_df(lines, build_NE_Lst(get_text(lines), lines), nlp, mode)
+
+    paragraphs = select_paragraphs(structure(lines), sections)
+    selected = [paragraph.text for paragraph in paragraphs]
+    df = build_df(selected, build_NE_Lst(get_text(selected), lines), nlp, mode)
+    df['Section'] = [paragraph.section for paragraph in paragraphs]
+
+    return df
+
+def annotate_file(path, save_path, nlp=None, mode=LABEL_MODE, sections=None):
+    """
+    Annotates a text file and writes its csv once, through a temporary file
+    """
+    df = annotate_lines(get_file(path), nlp, mode, sections)
+    tmp_path = save_path + ".tmp"
+    df.to_csv(tmp_path)
+    os.replace(tmp_path, save_path)
+
+    return df
@@ -0,0 +1,117 @@
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+
+# Labels of MRP1_Hudoc_NER_annotation.ipynb, tag ids are the 1-based positions in this list
+base_labels = ['LAW', 'CARDINAL', 'DATE', 'GPE', 'ORG',
+               'WORK_OF_ART', 'PERSON', 'NORP', 'LOC', 'COURT',
+               'CASE', 'JUDGE', 'REGISTRAR', 'APPLICATION', 'ARTICLE',
+               'SECTION', 'PARAGRAPH', 'PROTOCOL',
+               'VICTIMS', 'INVESTIGATORS', 'STATEMENTS', 'SECRETARY', 'LAWYER', 'DEFENDANT', 'PROSECUTOR', 'PETITION']
+
+# Rule families in priority order (the order of build_NE_Lst), a family earlier in the list wins overlaps
+RULES = [
+    ('DATE', [r'\d{1,2} \w+ \d{4}\b', r'[A-Z]\w+ \d{4}\b']),
+    ('COURT', [r'\w+ SECTION\b', r'European Court of Human Rights\b']),
+    ('JUDGE', []),
+    ('REGISTRAR', []),
+    ('CASE', [r'\w+ v. \w+', r'Cases', r'Case']),
+    ('APPLICATION', [r'no. \d{4,}/\d{2}\b', r'\d{4,}/\d{2}\b', r'application']),
+    ('PETITION', [r'petition', r'request', r'requests']),
+    ('ARTICLE', [r'Article \d+\b']),
+    ('PARAGRAPH', [r'§§ \d+', r'§ \d+\b']),
+]
+
+EntitySpan = namedtuple('EntitySpan', ['start', 'end', 'text', 'tag_id', 'label'])
+
+def get_tag_id(label):
+    return base_labels.index(label) + 1
+
+def get_board(lines):
+    """
+    Judges and registrars from the composition of the Court ('..., judges, and ..., Section Registrar,')
+    """
+    person_str = ""
+    for ln in lines:
+        if "judges" in ln:
+            person_str = ln
+            break
+
+    # Clean line and split judges
+    person_str = person_str.replace('and ', '').replace('President, ', '')
+    person_list = person_str.split(", judges, ")
+    if len(person_list) < 2:
+        return [], []
+    judges = [name for name in person_list[0].split(", ") if name]
+    registrars = [name for name in person_list[1].split(", ")[:-1] if name]
+
+    return judges, registrars
+
+@lru_cache(maxsize=256)
+def compile_rules(rules):
+    """
+    Compiles all rule families into one pattern with a named group per family. Literal gazetteer entries
+    are escaped, longest first. Every match has to start at a word boundary
+    """
+    groups = []
+    for label, patterns in rules:
+        if patterns:
+            groups.append("(?P<{}>{})".format(label, "|".join(patterns)))
+
+    return re.compile(r"(?<!\w)(?:{})".format("|".join(groups)))
+
+class EntityRuleEngine:
+    """
+    Scans a document once with all rule families and gazetteers and returns typed, non-overlapping spans
+    """
+    def __init__(self, rules=RULES, gazetteers=None):
+        gazetteers = gazetteers or {}
+        families = []
+        for label, patterns in rules:
+            names = sorted(set(gazetteers.get(label, [])), key=len, reverse=True)
+            literals = [re.escape(name) + r'(?!\w)' for name in names]
+            families.append((label, tuple(patterns) + tuple(literals)))
+
+        self.labels = [label for label, _ in families]
+        self.priority = {label: i for i, label in enumerate(self.labels)}
+        self.tag_ids = {label: get_tag_id(label) for label in self.labels}
+        self.pattern = compile_rules(tuple(families))
+
+    def candidates(self, text):
+        # The best family at every position where a rule matches, overlapping matches included
+        pattern = self.pattern
+        match = pattern.search(text)
+        while match is not None:
+            yield match.start(), match.end(), match.lastgroup
+            match = pattern.search(text, match.start() + 1)
+
+    def scan(self, text):
+        # Resolve overlaps: higher priority first, then longer spans, then earlier spans
+        candidates = sorted(self.candidates(text), key=lambda c: (self.priority[c[2]], c[0] - c[1], c[0]))
+        starts = []
+        spans = []
+        for start, end, label in candidates:
+            i = bisect_left(starts, start)
+            if i > 0 and spans[i - 1].end > start:
+                continue
+            if i < len(spans) and spans[i].start < end:
+                continue
+            starts.insert(i, start)
+            spans.insert(i, EntitySpan(start, end, text[start:end], self.tag_ids[label], label))
+
+        return spans
+
+def build_NE_Lst(target_string, lines):
+    """
+    Typed entity spans of a document, sorted by start. Judges and registrars are looked up in the
+    composition of the Court
+    """
+    judges, registrars = get_board(lines)
+    engine = EntityRuleEngine(RULES, {'JUDGE': judges, 'REGISTRAR': registrars})
+
+    return engine.scan(target_string)
+
+def to_re_dict(spans):
+    # The [start, phrase, tag_id, label] entries used by lable_text
+    return [[span.start, span.text, span.tag_id, span.label] for span in spans]
@@ -0,0 +1,84 @@
+import time
+import spacy
+from spacy.language import Language
+from spacy.lang.en import English
+from sentence_splitter import split_offsets
+
+# Trained pipeline used by the annotation and dependency stages
+MODEL = 'en_core_web_sm'
+
+# Components of MODEL every stage can do without. In en_core_web_sm the ner component has its own
+# embedding layer, so it does not need the shared tok2vec
+PROFILES = {
+    # Sentence boundaries only, no statistical model
+    'sentences': {'model': None, 'exclude': []},
+    # Entities and sentences, as used by the annotators
+    'ner': {'model': MODEL, 'exclude': ['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'senter']},
+    # Dependency labels and lemmas, as used by dependency_parser.processSentence
+    'dependencies': {'model': MODEL, 'exclude': ['ner', 'senter']},
+    # Everything, as spacy.load(MODEL)
+    'full': {'model': MODEL, 'exclude': []},
+}
+
+# Pipelines loaded in this process, by profile name
+loaded = {}
+
+@Language.component('legal_sentencizer')
+def legal_sentencizer(doc):
+    """
+    Sets sentence boundaries with the rule-based splitter for ECHR judgments
+    """
+    starts = {start for start, _ in split_offsets(doc.text)}
+    for token in doc:
+        token.is_sent_start = token.i == 0 or token.idx in starts
+
+    return doc
+
+def load_profile(name):
+    """
+    Loads the cheapest pipeline for a stage once per process
+    """
+    if name not in PROFILES:
+        raise ValueError("Unknown pipeline profile: {}, use one of {}".format(name, list(PROFILES)))
+
+    if name not in loaded:
+        profile = PROFILES[name]
+        if profile['model'] is None:
+            nlp = English()
+        else:
+            nlp = spacy.load(profile['model'], exclude=profile['exclude'])
+
+        # Without the parser, sentence boundaries come from the legal sentence splitter
+        if 'parser' not in nlp.pipe_names:
+            nlp.add_pipe('legal_sentencizer', first=True)
+        loaded[name] = nlp
+
+    return loaded[name]
+
+def benchmark_profiles(texts, profiles=('full', 'dependencies', 'ner', 'sentences'), batch_size=64):
+    """
+    Prints tokens/sec of every profile over the same texts, and the speedup compared to the full pipeline
+    """
+    results = {}
+    for name in profiles:
+        nlp = load_profile(name)
+        start = time.perf_counter()
+        n_tokens = sum(len(doc) for doc in nlp.pipe(texts, batch_size=batch_size))
+        elapsed = time.perf_counter() - start
+        results[name] = n_tokens / elapsed if elapsed > 0 else 0.0
+
+    for name in profiles:
+        speedup = results[name] / results['full'] if results.get('full') else float('nan')
+        print("{:<14} {:>10.0f} tokens/sec  {:>6.1f}x  {}".format(name, results[name], speedup,
+                                                                   load_profile(name).pipe_names))
+
+    return results
+
+if __name__ == "__main__":
+    # A paragraph of an ECHR judgment
+    text = "On 11 February 2014 the Broadcasting Council issued a new decision in which it again concluded that " \
+           "the applicant company had breached the Broadcasting and Retransmission Act and fined it EUR 500. " \
+           "It held that the applicant company's freedom of expression was to be restricted on the grounds of " \
+           "the ban on promoting drug use provided for in section 19(1)e) of the Broadcasting and " \
+           "Retransmission Act, which pursued the legitimate aim of protecting public order."
+    benchmark_profiles([text] * 500)
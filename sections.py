@@ -0,0 +1,100 @@
+import re
+from collections import Counter, namedtuple
+
+# Top level parts of a judgment in document order, a heading only moves forward, never back
+SECTIONS = ['HEADER', 'PROCEDURE', 'FACTS', 'LAW', 'OPERATIVE', 'SIGNATURE', 'OPINIONS', 'APPENDIX']
+
+# Parts where the relations we extract are found
+RELEVANT_SECTIONS = ('FACTS', 'LAW', 'OPERATIVE')
+
+# Lines that open a top level part
+SECTION_HEADINGS = [
+    ('PROCEDURE', re.compile(r'PROCEDURE')),
+    ('FACTS', re.compile(r'(?:AS TO )?THE FACTS')),
+    ('LAW', re.compile(r'(?:AS TO )?THE LAW')),
+    # Only the upper case heading, 'For these reasons, the Court finds ...' in THE LAW is an ordinary paragraph
+    ('OPERATIVE', re.compile(r'FOR THESE REASONS,? THE COURT\b[A-Z ,]*')),
+    ('SIGNATURE', re.compile(r'Done in (?:English|French)\b.*')),
+    ('OPINIONS', re.compile(r'(?:[A-Z]+LY |JOINT |PARTLY )*(?:CONCURRING|DISSENTING|SEPARATE)\b[A-Z ,\-]*OPINION\b.*'
+                            r'|DECLARATION OF JUDGE\b.*')),
+    ('APPENDIX', re.compile(r'(?:APPENDIX|ANNEX)\b.*')),
+]
+
+# Numbered lines: '12. The applicant ...', 'I. THE CIRCUMSTANCES OF THE CASE', 'A. The parties' submissions'
+NUMBERED_RE = re.compile(r'(?:(?P<number>\d+)|(?P<roman>[IVXL]+)|(?P<letter>[A-Z]|\([a-z]\)))\.?\s+\S')
+
+# Headings are short and do not end like a sentence
+MAX_HEADING_LENGTH = 200
+
+Paragraph = namedtuple('Paragraph', ['index', 'text', 'section', 'heading', 'number'])
+
+def match_section(line):
+    # Headings are short lines
+    if len(line) > MAX_HEADING_LENGTH:
+        return None
+    for section, pattern in SECTION_HEADINGS:
+        if pattern.fullmatch(line):
+            return section
+    return None
+
+def is_heading(line):
+    return len(line) <= MAX_HEADING_LENGTH and not line.endswith(('.', ';', ':', ','))
+
+def structure(lines):
+    """
+    Splits the lines of a judgment (one paragraph per line, as extracted by hudoc_text) into paragraphs with
+    their top level section, the last sub heading above them and their paragraph number. When neither THE
+    FACTS nor THE LAW is found the sections are unknown, and every paragraph gets section None
+    """
+    paragraphs = []
+    section = 0
+    heading = None
+    expected = 1
+    for i, line in enumerate(lines):
+        text = line.strip()
+        number = None
+
+        found = match_section(text) if text else None
+        if found is not None and SECTIONS.index(found) > section:
+            section = SECTIONS.index(found)
+            heading = text
+        elif text:
+            match = NUMBERED_RE.match(text)
+            if match is not None and match.group('number') is not None:
+                # Paragraph numbers run through the whole judgment, other numbers are sub headings
+                n = int(match.group('number'))
+                if n == expected or not is_heading(text):
+                    number = n
+                    expected = n + 1
+                else:
+                    heading = text
+            elif match is not None and is_heading(text) and (match.group('roman') or text.upper() == text
+                                                               or len(text) < 100):
+                heading = text
+            elif text.isupper() and is_heading(text):
+                heading = text
+
+        paragraphs.append(Paragraph(i, line, SECTIONS[section], heading, number))
+
+    if not any(paragraph.section in ('FACTS', 'LAW') for paragraph in paragraphs):
+        paragraphs = [paragraph._replace(section=None) for paragraph in paragraphs]
+
+    return paragraphs
+
+def is_structured(paragraphs):
+    return any(paragraph.section is not None for paragraph in paragraphs)
+
+def select_paragraphs(paragraphs, sections=RELEVANT_SECTIONS):
+    # Paragraphs of unknown sections are always kept, a judgment without recognised headings is not dropped
+    return [paragraph for paragraph in paragraphs if paragraph.section is None or paragraph.section in sections]
+
+def select_lines(lines, sections=RELEVANT_SECTIONS):
+    # The lines of a judgment that belong to the given sections
+    return [paragraph.text for paragraph in select_paragraphs(structure(lines), sections)]
+
+def section_sizes(paragraphs):
+    # Characters per section, to see how much text a selection skips
+    sizes = Counter()
+    for paragraph in paragraphs:
+        sizes[paragraph.section] += len(paragraph.text)
+    return sizes
@@ -0,0 +1,84 @@
+import re
+import time
+
+# Abbreviations that end with a period but almost never end a sentence in ECHR judgments
+ABBREVIATIONS = {
+    'no', 'nos', 'v', 'vs', 'mr', 'mrs', 'ms', 'dr', 'prof', 'judge', 'ibid', 'id', 'cf', 'e.g', 'i.e', 'etc',
+    'art', 'arts', 'para', 'paras', 'p', 'pp', 'ch', 'vol', 'ed', 'eds', 'op', 'cit', 'seq', 'et al', 'al',
+    'st', 'jr', 'sr', 'ltd', 'co', 'inc', 'corp', 'plc', 'nr', 'fig', 'approx', 'sec', 'subsec', 'ann',
+    'rec', 'doc', 'ref', 'resp', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct',
+    'nov', 'dec', 'gen', 'col', 'lt', 'sgt', 'capt', 'hon', 'rev', 'u.s', 'u.k', 'e.c', 'o.j', 'a.s',
+}
+
+def not_after(words, flags=''):
+    """
+    Negative lookbehinds (one per word length, as lookbehinds need a fixed width) for a period that follows
+    one of words, when the word is at the start of the text or after whitespace or an opening bracket or quote
+    """
+    lookbehinds = []
+    for length in sorted({len(word) for word in words}):
+        alternatives = "|".join(re.escape(word) for word in sorted(words) if len(word) == length)
+        group = "(?{}:{})".format(flags, alternatives) if flags else "(?:{})".format(alternatives)
+        lookbehinds.append(r'(?<![\s(\["“‘\']{}\.)(?<!^{}\.)'.format(group, group))
+
+    return "".join(lookbehinds)
+
+# Candidate boundaries: sentence-final punctuation with optional closing quotes or brackets, followed by
+# whitespace and a character that can start a sentence (lower case, digits and citation marks continue it,
+# as in 'no. 11882/10' or 'cited above, § 62'), or line breaks between the paragraphs of a judgment. A bare
+# period does not end an abbreviation or an initial ('Mr B. Hajdukovic'), which the lookbehinds rule out
+FOLLOWS_RE = r'[ \t\xa0]+(?![a-z\d§(,;:])(?=\S)'
+# Every alternative starts with a character set, so the regex engine can skip to the next candidate quickly
+BOUNDARY_RE = re.compile(
+    r'(?P<period>\.)' + not_after(ABBREVIATIONS, 'i') + r'(?<![\s(\["“‘\'][A-ZÀ-ÖØ-Þ]\.)(?<!^[A-ZÀ-ÖØ-Þ]\.)'
+    + FOLLOWS_RE +
+    r'|(?P<punct>[!?][.!?]*["\'”’)\]]*|\.(?:[.!?]+["\'”’)\]]*|["\'”’)\]]+))' + FOLLOWS_RE +
+    r'|\n\s*')
+
+# Paragraph and list numbering at the start of a sentence, like '12', '(a)' or 'iv'
+NUMBERING_RE = re.compile(r'\(?(\d+|[a-z]|[ivxlc]+)\)?')
+
+def split_offsets(text):
+    """
+    Returns the (start, end) character offsets of all sentences in text, without surrounding whitespace
+    """
+    offsets = []
+    start = len(text) - len(text.lstrip())
+    for match in BOUNDARY_RE.finditer(text):
+        end = match.start()
+
+        if match.lastgroup is None:
+            # The whitespace before a line break is not part of the sentence
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        else:
+            # A paragraph number is not a sentence of its own
+            if match.lastgroup == 'period' and end - start <= 6 and NUMBERING_RE.fullmatch(text, start, end):
+                continue
+
+            # The closing punctuation belongs to the sentence
+            end = match.end(match.lastgroup)
+
+        if end > start:
+            offsets.append((start, end))
+        start = match.end()
+
+    # The last sentence
+    end = len(text.rstrip())
+    if end > start:
+        offsets.append((start, end))
+
+    return offsets
+
+def split_sentences(text):
+    return [text[start:end] for start, end in split_offsets(text)]
+
+def benchmark_splitter(texts):
+    # Throughput in MB/s over the given texts
+    size = sum(len(text.encode('utf-8')) for text in texts)
+    start = time.perf_counter()
+    n_sentences = sum(len(split_offsets(text)) for text in texts)
+    elapsed = time.perf_counter() - start
+    print("{} sentences in {:.3f}s ({:.1f} MB/s)".format(n_sentences, elapsed, size / elapsed / 1e6))
+
+    return size / elapsed / 1e6
@@ -0,0 +1,170 @@
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+from spacy.attrs import ENT_IOB, ENT_TYPE
+from spacy.tokens import Doc
+from tqdm import tqdm
+from nlp_profiles import load_profile
+from annotated_corpus import MERGE_LABELS, TOKEN_CORPUS_FN, label_list, parse_list, tag_codes, write_token_corpus
+
+# Base label of every tag id (0 for 'O') and whether it is an inside tag
+TAG_LABEL = np.array([0] + [(i - 1) // 2 + 1 for i in range(1, len(label_list))], dtype=np.int64)
+TAG_INSIDE = np.array([False] + [(i - 1) % 2 == 1 for i in range(1, len(label_list))])
+
+class MergePolicy:
+    """
+    Decides which source wins where regex and model both tagged a token: default for every regex label,
+    overrides per regex label, e.g. MergePolicy('regex', {'DATE': 'model'})
+    """
+    def __init__(self, default='regex', overrides=None):
+        overrides = overrides or {}
+        for source in [default] + list(overrides.values()):
+            if source not in ('regex', 'model'):
+                raise ValueError("Unknown tag source: {}, use 'regex' or 'model'".format(source))
+
+        self.default = default
+        self.overrides = overrides
+        # regex_wins[label] for every base label, indexed like TAG_LABEL
+        self.regex_wins = np.array([default == 'regex'] + [overrides.get(label, default) == 'regex'
+                                                             for label in MERGE_LABELS])
+
+def encode_tags(tags):
+    # Tag names to ids, unknown tags are 'O'
+    return np.fromiter((tag_codes.get(tag, 0) for tag in tags), dtype=np.int64, count=len(tags))
+
+def decode_tags(codes):
+    return [label_list[code] for code in codes]
+
+def model_tags(words, nlp=None, batch_size=64):
+    """
+    Entity tag ids of the model for all rows of words at once. The model runs on the given tokens, so its
+    tags are aligned with the regex tags
+    """
+    if nlp is None:
+        nlp = load_profile('ner')
+
+    # Hash of every entity type to its base label
+    type_labels = {nlp.vocab.strings.add(label): i + 1 for i, label in enumerate(MERGE_LABELS)}
+    docs = (Doc(nlp.vocab, words=row) for row in words)
+    arrays = [doc.to_array([ENT_IOB, ENT_TYPE]).reshape(-1, 2)
+              for doc in nlp.pipe(docs, batch_size=batch_size)]
+    if not arrays:
+        return np.zeros(0, dtype=np.int64)
+    array = np.concatenate(arrays).astype(np.uint64)
+
+    labels = np.fromiter((type_labels.get(int(h), 0) for h in array[:, 1]), dtype=np.int64, count=len(array))
+    # ENT_IOB: 1 = I, 2 = O, 3 = B
+    iob = array[:, 0]
+    codes = np.where(labels > 0, (labels - 1) * 2 + 1, 0)
+    codes = np.where((iob == 1) & (labels > 0), codes + 1, codes)
+
+    return np.where((iob == 2) | (iob == 0), 0, codes)
+
+def repair_bio(codes, row_starts):
+    # An inside tag that does not continue an entity of the same label (in the same row) starts a new one
+    previous = np.concatenate([[0], TAG_LABEL[codes[:-1]]])
+    previous[row_starts] = 0
+    broken = TAG_INSIDE[codes] & (previous != TAG_LABEL[codes])
+    codes = codes.copy()
+    codes[broken] -= 1
+
+    return codes
+
+def merge_tags(regex, model, policy=None, row_starts=None, stats=None):
+    """
+    Merges aligned regex and model tag ids. A token tagged by one source keeps that tag, a token tagged by
+    both gets the tag of the source the policy prefers. Counts of agreements and disagreements per label pair
+    are added to stats
+    """
+    policy = policy or MergePolicy()
+    regex_label = TAG_LABEL[regex]
+    model_label = TAG_LABEL[model]
+
+    use_regex = (regex != 0) & ((model == 0) | policy.regex_wins[regex_label])
+    merged = np.where(use_regex, regex, model)
+    row_starts = np.asarray([] if row_starts is None else row_starts, dtype=np.int64)
+    merged = repair_bio(merged, row_starts[row_starts < len(merged)])
+
+    if stats is not None:
+        both = (regex != 0) & (model != 0)
+        stats['tokens'] += len(merged)
+        stats['regex_only'] += int(((regex != 0) & (model == 0)).sum())
+        stats['model_only'] += int(((regex == 0) & (model != 0)).sum())
+        stats['agree'] += int((both & (regex_label == model_label)).sum())
+        disagree = both & (regex_label != model_label)
+        stats['disagree'] += int(disagree.sum())
+        pairs, counts = np.unique(regex_label[disagree] * len(label_list) + model_label[disagree],
+                                  return_counts=True)
+        for pair, count in zip(pairs, counts):
+            key = (MERGE_LABELS[pair // len(label_list) - 1], MERGE_LABELS[pair % len(label_list) - 1])
+            stats['pairs'][key] += int(count)
+
+    return merged
+
+def new_stats():
+    return {'tokens': 0, 'regex_only': 0, 'model_only': 0, 'agree': 0, 'disagree': 0, 'pairs': Counter()}
+
+def merge_file(fn, nlp=None, policy=None, stats=None, batch_size=64):
+    """
+    Merges the model tags into the regex tags of an annotated file (as written by ner_alignment), returns
+    a DataFrame with the columns Text, Word, POS and Tag (and Section, if the file has it)
+    """
+    data = pd.read_csv(fn)
+    words = [parse_list(cell) for cell in data['Word']]
+    regex_rows = [parse_list(cell) for cell in data['Tag']]
+    lengths = np.array([len(row) for row in words], dtype=np.int64)
+    if any(len(tags) != n for tags, n in zip(regex_rows, lengths)):
+        raise ValueError("{}: words and tags are not aligned".format(fn))
+
+    # All rows of the file at once
+    regex = encode_tags([tag for row in regex_rows for tag in row])
+    model = model_tags(words, nlp, batch_size)
+    row_starts = np.cumsum(lengths)[:-1]
+    merged = decode_tags(merge_tags(regex, model, policy, row_starts, stats))
+
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    tags = [merged[bounds[i]:bounds[i + 1]] for i in range(len(words))]
+
+    merged_df = pd.DataFrame({'Text': data['Text'], 'Word': words, 'POS': data['POS'], 'Tag': tags},
+                             columns=['Text', 'Word', 'POS', 'Tag'])
+    # Files annotated by section keep their sections for the labeling stage
+    if 'Section' in data:
+        merged_df['Section'] = data['Section']
+
+    return merged_df
+
+def merge_folder(folder_path, save_path=TOKEN_CORPUS_FN, nlp=None, policy=None, batch_size=64):
+    """
+    Builds the token corpus (all_annotated_regex.arrow, see annotated_corpus) from the annotated files in
+    folder_path, one file at a time. Returns the merge statistics, files that could not be merged are listed
+    under 'failed'
+    """
+    if nlp is None:
+        nlp = load_profile('ner')
+    stats = new_stats()
+    stats['failed'] = []
+    # Only the annotated files, not the runner's manifest.jsonl or the .csv.tmp files of an interrupted run
+    files = [fn for fn in next(os.walk(folder_path), (None, None, []))[2] if fn.endswith('.csv')]
+
+    def rows():
+        for fn in tqdm(sorted(files)):
+            try:
+                merged = merge_file(os.path.join(folder_path, fn), nlp, policy, stats, batch_size)
+            except Exception as e:
+                stats['failed'].append((fn, repr(e)))
+                continue
+            sections = merged['Section'] if 'Section' in merged else [None] * len(merged)
+            for text, words, tags, section in zip(merged['Text'], merged['Word'], merged['Tag'], sections):
+                yield ((text if isinstance(text, str) else None), words, tags,
+                       (section if isinstance(section, str) else None))
+
+    write_token_corpus(save_path, rows())
+
+    print("{} tokens merged, {} regex only, {} model only, {} agree, {} disagree, {} files failed".format(
+        stats['tokens'], stats['regex_only'], stats['model_only'], stats['agree'], stats['disagree'],
+        len(stats['failed'])))
+    for (regex_label, model_label), count in stats['pairs'].most_common(10):
+        print("  regex {} / model {}: {}".format(regex_label, model_label, count))
+
+    return stats
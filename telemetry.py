@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of requests in flight. The limit grows by one after every healthy window of requests
+    and is halved when the error rate or the median latency of a window rises (AIMD)
+    """
+    def __init__(self, max_limit, min_limit=1, initial=None, window=20, max_error_rate=0.05, latency_factor=2.0):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = initial if initial is not None else max(self.min_limit, max_limit // 4)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.baseline = None
+        self.results = deque()
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, latency, ok):
+        async with self.condition:
+            self.in_flight -= 1
+            self.results.append((latency, ok))
+            if len(self.results) >= self.window:
+                self.adjust()
+            self.condition.notify_all()
+
+    def adjust(self):
+        latencies = sorted(latency for latency, ok in self.results if ok)
+        errors = sum(1 for _, ok in self.results if not ok)
+        self.results.clear()
+
+        # The fastest healthy window seen so far is the latency baseline
+        median = latencies[len(latencies) // 2] if latencies else None
+        if median is not None:
+            self.baseline = median if self.baseline is None else min(self.baseline, median)
+
+        # Back off on errors or slow responses, speed up while healthy
+        slow = median is not None and median > self.latency_factor * self.baseline
+        if errors / self.window > self.max_error_rate or slow:
+            self.limit = max(self.min_limit, self.limit // 2)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+class DownloadTelemetry:
+    """
+    Collects per-request latencies, bytes, retries and error classes of the scraper
+    """
+    def __init__(self, name='scraper'):
+        self.name = name
+        self.started = time.time()
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.requests = Counter()
+        self.errors = Counter()
+        self.retries = 0
+        self.bytes = 0
+        self.documents = Counter()
+        self.concurrency = 0
+
+    def observe_request(self, latency, status, nbytes=0):
+        # Histogram bucket of the latency, the last bucket is +Inf
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                index = i
+                break
+        self.bucket_counts[index] += 1
+        self.latency_sum += latency
+        self.requests[str(status)] += 1
+        self.bytes += nbytes
+
+    def observe_error(self, error):
+        # HTTP errors are classified by status code, everything else by exception class
+        status = getattr(error, 'status', None)
+        self.errors["HTTP {}".format(status) if status else type(error).__name__] += 1
+
+    def to_dict(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        total = sum(self.bucket_counts)
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(LATENCY_BUCKETS + ['+Inf'], self.bucket_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {'elapsed_seconds': elapsed,
+                'requests': dict(self.requests),
+                'errors': dict(self.errors),
+                'retries': self.retries,
+                'bytes': self.bytes,
+                'bytes_per_second': self.bytes / elapsed,
+                'documents': dict(self.documents),
+                'concurrency_limit': self.concurrency,
+                'latency_seconds': {'count': total, 'sum': self.latency_sum, 'buckets': buckets}}
+
+    def to_prometheus(self):
+        metrics = self.to_dict()
+        lines = ["# TYPE {}_request_latency_seconds histogram".format(self.name)]
+        for bound, count in metrics['latency_seconds']['buckets'].items():
+            lines.append('{}_request_latency_seconds_bucket{{le="{}"}} {}'.format(self.name, bound, count))
+        lines.append("{}_request_latency_seconds_sum {}".format(self.name, metrics['latency_seconds']['sum']))
+        lines.append("{}_request_latency_seconds_count {}".format(self.name, metrics['latency_seconds']['count']))
+
+        lines.append("# TYPE {}_requests_total counter".format(self.name))
+        for status, count in sorted(metrics['requests'].items()):
+            lines.append('{}_requests_total{{status="{}"}} {}'.format(self.name, status, count))
+        lines.append("# TYPE {}_errors_total counter".format(self.name))
+        for error, count in sorted(metrics['errors'].items()):
+            lines.append('{}_errors_total{{class="{}"}} {}'.format(self.name, error, count))
+        lines.append("# TYPE {}_documents_total counter".format(self.name))
+        for result, count in sorted(metrics['documents'].items()):
+            lines.append('{}_documents_total{{result="{}"}} {}'.format(self.name, result, count))
+
+        lines.append("# TYPE {}_retries_total counter".format(self.name))
+        lines.append("{}_retries_total {}".format(self.name, metrics['retries']))
+        lines.append("# TYPE {}_bytes_total counter".format(self.name))
+        lines.append("{}_bytes_total {}".format(self.name, metrics['bytes']))
+        lines.append("# TYPE {}_bytes_per_second gauge".format(self.name))
+        lines.append("{}_bytes_per_second {}".format(self.name, metrics['bytes_per_second']))
+        lines.append("# TYPE {}_concurrency_limit gauge".format(self.name))
+        lines.append("{}_concurrency_limit {}".format(self.name, metrics['concurrency_limit']))
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, fn):
+        """
+        Writes fn.json and fn.prom (for the node exporter textfile collector), both replaced atomically
+        """
+        Path(fn).parent.mkdir(parents=True, exist_ok=True)
+        for extension, content in [(".json", json.dumps(self.to_dict(), indent=2)), (".prom", self.to_prometheus())]:
+            tmp_fn = fn + extension + ".tmp"
+            with open(tmp_fn, 'w') as f:
+                f.write(content)
+            os.replace(tmp_fn, fn + extension)
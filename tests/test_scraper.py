@@ -0,0 +1,152 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import sys
+import zipfile
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import Scraper
+
+def make_docx(text):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', text * 500)
+    return buffer.getvalue()
+
+class StubServer:
+    """
+    HUDOC docx conversion endpoint: serves DOCS[id] with an ETag, honours Range with If-Range and
+    If-None-Match, and can fail the first requests of an id
+    """
+    def __init__(self):
+        self.docs = {}
+        self.etags = {}
+        self.failures = {}
+        self.gzip = False
+        self.requests = []
+
+    async def handle(self, request):
+        entry_id = request.query['id']
+        self.requests.append((entry_id, dict(request.headers)))
+        if self.failures.get(entry_id):
+            self.failures[entry_id] -= 1
+            return web.Response(status=503)
+
+        doc, etag = self.docs[entry_id], self.etags[entry_id]
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range') == etag:
+            start = int(range_header[len('bytes='):-1])
+            return web.Response(status=206, body=doc[start:], headers={
+                'ETag': etag, 'Content-Range': "bytes {}-{}/{}".format(start, len(doc) - 1, len(doc))})
+
+        if self.gzip:
+            return web.Response(body=gzip.compress(doc), headers={'ETag': etag, 'Content-Encoding': 'gzip'})
+        return web.Response(body=doc, headers={'ETag': etag})
+
+def run(server, ids, folder, **kwargs):
+    async def main():
+        app = web.Application()
+        app.router.add_get('/docx', server.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await Scraper.download_all(ids, folder, "http://127.0.0.1:{}/docx?id=".format(port),
+                                              concurrency=2, retries=2, backoff=0, adaptive=False, **kwargs)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+def new_server(*ids):
+    server = StubServer()
+    for entry_id in ids:
+        server.docs[entry_id] = make_docx(entry_id)
+        server.etags[entry_id] = '"{}-v1"'.format(entry_id)
+    return server
+
+def read(folder, entry_id):
+    with open(os.path.join(folder, entry_id + ".docx"), 'rb') as f:
+        return f.read()
+
+def test_fresh_download(tmp_path):
+    server = new_server('001-1', '001-2')
+    stats = run(server, ['001-1', '001-2'], str(tmp_path))
+
+    assert stats['downloaded'] == 2 and stats['failed'] == []
+    assert read(tmp_path, '001-1') == server.docs['001-1']
+    assert Scraper.load_manifest(str(tmp_path))['001-2']['etag'] == '"001-2-v1"'
+
+def test_range_resume_with_if_range(tmp_path):
+    server = new_server('001-1')
+    doc = server.docs['001-1']
+    part_fn = os.path.join(str(tmp_path), '001-1.docx.part')
+    with open(part_fn, 'wb') as f:
+        f.write(doc[:100])
+    with open(part_fn + ".json", 'w') as f:
+        json.dump({'etag': '"001-1-v1"', 'last_modified': None}, f)
+
+    stats = run(server, ['001-1'], str(tmp_path))
+
+    headers = server.requests[0][1]
+    assert headers['Range'] == 'bytes=100-' and headers['If-Range'] == '"001-1-v1"'
+    assert stats['downloaded'] == 1 and read(tmp_path, '001-1') == doc
+    assert not os.path.exists(part_fn) and not os.path.exists(part_fn + ".json")
+
+def test_changed_document_is_not_spliced(tmp_path):
+    server = new_server('001-1')
+    part_fn = os.path.join(str(tmp_path), '001-1.docx.part')
+    with open(part_fn, 'wb') as f:
+        f.write(make_docx('old')[:100])
+    with open(part_fn + ".json", 'w') as f:
+        json.dump({'etag': '"001-1-v0"', 'last_modified': None}, f)
+
+    run(server, ['001-1'], str(tmp_path))
+
+    assert read(tmp_path, '001-1') == server.docs['001-1']
+
+def test_truncated_file_is_fetched_again(tmp_path):
+    server = new_server('001-1')
+    run(server, ['001-1'], str(tmp_path))
+    with open(os.path.join(str(tmp_path), '001-1.docx'), 'r+b') as f:
+        f.truncate(50)
+
+    stats = run(server, ['001-1'], str(tmp_path))
+
+    assert stats['downloaded'] == 1 and stats['skipped'] == 0
+    assert read(tmp_path, '001-1') == server.docs['001-1']
+
+def test_revalidation_not_modified(tmp_path):
+    server = new_server('001-1')
+    run(server, ['001-1'], str(tmp_path))
+
+    stats = run(server, ['001-1'], str(tmp_path), revalidate=True)
+
+    assert stats['not_modified'] == 1 and stats['downloaded'] == 0
+    assert server.requests[-1][1]['If-None-Match'] == '"001-1-v1"'
+
+def test_server_error_is_retried(tmp_path):
+    server = new_server('001-1', '001-2')
+    server.failures = {'001-1': 2, '001-2': 5}
+
+    stats = run(server, ['001-1', '001-2'], str(tmp_path))
+
+    assert stats['downloaded'] == 1 and stats['failed'] == ['001-2']
+    assert read(tmp_path, '001-1') == server.docs['001-1']
+
+def test_compressed_response(tmp_path):
+    server = new_server('001-1')
+    server.gzip = True
+
+    stats = run(server, ['001-1'], str(tmp_path))
+
+    assert server.requests[0][1]['Accept-Encoding'] == 'identity'
+    assert stats['downloaded'] == 1 and read(tmp_path, '001-1') == server.docs['001-1']